@@ -0,0 +1,70 @@
+import time
+import threading
+from collections import OrderedDict
+
+
+class ResultCache(object):
+    """
+    A bounded, time-expiring cache for LDAP results.
+
+    Entries are evicted in least-recently-used order once ``maxsize`` entries
+    are held, and are treated as missing once their time-to-live has passed.
+
+    Every key MUST be a tuple whose first element is the DN the cached result
+    was read from (the search base for searches).  This is what allows
+    invalidate() to drop the results that a write to some DN may have made
+    stale.
+    """
+
+    def __init__(self, maxsize=2048):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def get(self, key, default=None):
+        """Return the value stored for ``key`` if it has not yet expired."""
+        with self._lock:
+            try:
+                expires, value = self._data[key]
+            except KeyError:
+                return default
+            if expires <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        """Store ``value`` under ``key`` for ``ttl`` seconds."""
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, dn):
+        """
+        Drop every entry that a change to ``dn`` could have made stale.
+
+        That is any entry read from ``dn`` itself, from an ancestor of ``dn``
+        (a subtree search would have included it) or from a descendant of
+        ``dn``.  DNs are compared case-insensitively.
+        """
+        dn = dn.lower()
+        with self._lock:
+            for key in list(self._data):
+                base = key[0].lower()
+                if (base == dn or dn.endswith(',' + base)
+                        or base.endswith(',' + dn)):
+                    del self._data[key]
+
+    def clear(self):
+        """Drop every entry."""
+        with self._lock:
+            self._data.clear()
@@ -1,19 +1,50 @@
-import re
+import copy
 import logging
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 from getpass import getpass
 
 import ldap
 import ldap.modlist as modlist
+from ldap.controls import SimplePagedResultsControl
+from ldap.dn import escape_dn_chars
+from ldap.filter import filter_format
 
+from .cache import ResultCache
+from .pool import ConnectionPool
 from .exceptions import (
     AddDNFailed,
     NoSuchDN,
     NoSuchAttrValue,
     DuplicateValue,
 )
+from .utils import chunks_of
 
 log = logging.getLogger(__name__)
 
+# the dn of a lazy connection that has yet to ask the server who it is
+_UNRESOLVED = object()
+
+
+def _offending_mod(mods, *ops):
+    """
+    Return the modification to blame for an error: the only one if there
+    is just one, else the first one with one of ``ops``.
+    """
+    if len(mods) > 1:
+        for mod in mods:
+            if mod[0] in ops:
+                return mod
+    return mods[0]
+
+
+def _close_pool(pool):
+    """Unbind a pool's handles, ignoring errors during interpreter shutdown."""
+    try:
+        pool.close()
+    except Exception:
+        pass
+
 
 class BaseConnection(object):
 
@@ -31,22 +62,76 @@ class BaseConnection(object):
 
       :BASEDN:
         The base DN of the LDAP tree.
+
+    Results of search() and exists() can be cached, which is off unless a
+    subclass turns it on.  Cached results may lag behind changes made by
+    other processes for up to the TTL; pass use_cache=False to read straight
+    from the server.
+
+      :cache_ttl:
+        Seconds that a non-empty search result or a successful existence
+        check is reused.  Defaults to 0, which disables caching.
+
+      :negative_cache_ttl:
+        Seconds that an empty search result or a failed existence check is
+        reused.  Defaults to 0, which disables caching.
+
+    Each connection object keeps a pool of LDAP handles bound as the same
+    identity so that it can be shared between threads:
+
+      :max_pool_size:
+        The most handles that will be open at once.  Defaults to 4.
+
+      :add_pipeline_depth:
+        The most adds that add_many() sends on one handle before reading
+        their answers.  Defaults to 32.
+
+      :min_pool_size:
+        Handles bound up front, unless the connection is lazy.  Defaults
+        to 1.
+
+      :pool_idle_timeout:
+        Seconds a handle may sit unused before it is checked for liveness
+        on its next checkout.  None disables the check.  Defaults to 300.
     """
 
     __human_readable_name__ = 'LDAP'
-    attrlist = [
+    # a tuple, so that it can be shared by every search without any risk
+    # of a caller mutating it, and reused as-is in cache keys.
+    attrlist = (
         '*', 'createTimestamp', 'modifyTimestamp',
         'creatorsName', 'modifiersName',
-    ]
+    )
+
+    cache_ttl = 0
+    negative_cache_ttl = 0
+    _result_cache = ResultCache(maxsize=2048)
+    _negative_cache = ResultCache(maxsize=2048)
+
+    max_pool_size = 4
+    add_pipeline_depth = 32
+    min_pool_size = 1
+    pool_idle_timeout = 300
 
     # subclasses must define: BASE_DN, and URI
 
     def __init__(self, logindn, password, uri=None, certfile=None,
-                 basedn=None):
+                 basedn=None, lazy=False):
+        """
+        Bind to the LDAP as ``logindn`` with ``password``, or anonymously if
+        both are None.
+
+        If ``lazy`` is True, nothing is sent to the server until the
+        connection is first used, so a connection whose every search is
+        answered from the cache never binds at all.  Bad credentials then
+        raise at first use rather than here.
+        """
         if basedn:
             self.basedn = basedn
         else:
             self.basedn = self.__class__.BASE_DN
+        # login shortnames are expanded into this on every bind
+        self._user_dn_template = 'uid=%s,ou=people,' + self.basedn
 
         if uri:
             self.uri = uri
@@ -56,39 +141,66 @@ class BaseConnection(object):
         if certfile:
             ldap.set_option(ldap.OPT_X_TLS_CACERTFILE, certfile)
 
-        self.ldaps = ldap.initialize(self.uri)
-        self.ldaps.set_option(ldap.OPT_PROTOCOL_VERSION, 3)
-
+        if logindn is not None:
+            logindn = self._fully_qualify_dn(logindn)
+        self._pool = ConnectionPool(self.uri, logindn, password,
+                                    max_size=self.max_pool_size,
+                                    idle_timeout=self.pool_idle_timeout)
+        if not lazy:
+            # bind handles up front so that bad credentials fail right away
+            self._pool.fill(max(self.min_pool_size, 1))
+        self._finalizer = weakref.finalize(self, _close_pool, self._pool)
+
+        # A successful bind with a DN and a password tells us who we are
+        # without another round-trip.  Otherwise (a username@domain login,
+        # or an empty password, which the server treats as an anonymous
+        # bind) ask the server, which a lazy connection leaves until the dn
+        # is first needed.
         if logindn is None and password is None:
-            self.ldaps.simple_bind_s()
+            self._dn = None
+        elif password and '=' in logindn:
+            self._dn = logindn
+        elif lazy:
+            self._dn = _UNRESOLVED
         else:
-            fq_logindn = self._fully_qualify_dn(logindn)
-            self.ldaps.simple_bind_s(fq_logindn, password)
+            self._dn = self._whoami_s()
+        # Cached results are kept apart per identity.  The login tells
+        # identities apart without asking the server, since an empty
+        # password binds anonymously whatever the dn.
+        self._cache_identity = logindn if password else None
+        if lazy:
+            log.debug('deferring login: %s on %s', logindn, self.uri)
+        else:
+            log.debug('login successful: %s on %s', self.dn, self.uri)
 
-        self.dn = self.whoami()
-        log.debug('login successful: %s on %s', self.dn, self.uri)
+    @property
+    def dn(self):
+        """The DN this connection is bound as, or None if anonymous."""
+        if self._dn is _UNRESOLVED:
+            self._dn = self._whoami_s()
+        return self._dn
 
     def _fully_qualify_dn(self, logindn):
         """Return a full-qualified login dn."""
-        if not re.search('=', logindn) and not re.search('@', logindn):
-            logindn = "uid=%s,ou=people,%s" % (logindn, self.basedn)
-        return logindn
+        if '=' in logindn or '@' in logindn:
+            return logindn
+        return self._user_dn_template % escape_dn_chars(logindn)
 
     @classmethod
-    def connect(cls, logindn=None, password=None, uri=None,
-                certfile=None, basedn=None, retries=3):
+    def _attempt_bind(cls, logindn, password, uri, certfile, basedn, retries,
+                      log_fn):
         """
-        Attempt to establish a connection using the supplied parameters.
+        Try up to ``retries`` times to bind, prompting for any credentials
+        that were not supplied.  A failed attempt is logged with ``log_fn``
+        and prompts for the password again.
 
-        Return a connection object.  Return None if unsuccessful.
+        Return a (connection, password) tuple, or (None, None) if every
+        attempt failed.
         """
         name = cls.__human_readable_name__
 
         # tmpuri is the uri name that we'll print in log messages
-        if uri is None:
-            tmpuri = cls.URI
-        else:
-            tmpuri = uri
+        tmpuri = cls.URI if uri is None else uri
 
         for x in range(1, retries + 1):
             if logindn is None:
@@ -96,18 +208,31 @@ class BaseConnection(object):
             if password is None:
                 password = getpass('Password for %s (%s): ' % (name, logindn))
             try:
-                return cls(
+                conn = cls(
                     logindn=logindn,
                     password=password,
                     uri=uri,
                     certfile=certfile,
                     basedn=basedn,
                 )
+                return conn, password
             except ldap.LDAPError:
-                log.warning('login attempt %d failed: %s on %s', x, logindn, tmpuri)
+                log_fn('login attempt %d failed: %s on %s', x, logindn, tmpuri)
                 password = None  # prompt again for password on next try
 
-        return None  # all retries failed
+        return None, None  # all retries failed
+
+    @classmethod
+    def connect(cls, logindn=None, password=None, uri=None,
+                certfile=None, basedn=None, retries=3):
+        """
+        Attempt to establish a connection using the supplied parameters.
+
+        Return a connection object.  Return None if unsuccessful.
+        """
+        conn, _ = cls._attempt_bind(logindn, password, uri, certfile, basedn,
+                                    retries, log.warning)
+        return conn
 
     @classmethod
     def prompt(cls, logindn=None, password=None, uri=None,
@@ -119,40 +244,16 @@ class BaseConnection(object):
 
         Return the password used if successful and None if unsuccessful.
         """
-        name = cls.__human_readable_name__
-
-        # tmpuri is the uri name that we'll print in log messages
-        if uri is None:
-            tmpuri = cls.URI
-        else:
-            tmpuri = uri
-
-        for x in range(retries):
-            if logindn is None:
-                logindn = input('Enter a %s loginDN or username: ' % name)
-            if password is None:
-                password = getpass('Password for %s (%s): ' % (name, logindn))
-            try:
-                conn = cls(
-                    logindn=logindn,
-                    password=password,
-                    uri=uri,
-                    certfile=certfile,
-                    basedn=basedn,
-                )
-                log.debug('login successful: %s on %s', logindn, tmpuri)
-                cls.set_connection(conn)
-                return password
-            except ldap.LDAPError:
-                log.error('login attempt %d failed: %s on %s', x, logindn, tmpuri)
-                password = None  # prompt again for password on next try
-
-        return None  # all retries failed
+        conn, password = cls._attempt_bind(logindn, password, uri, certfile,
+                                           basedn, retries, log.error)
+        if conn is not None:
+            cls.set_connection(conn)
+        return password
 
     @classmethod
-    def connect_anon(cls, uri=None):
+    def connect_anon(cls, uri=None, lazy=False):
         """Return an anonymous connection to the LDAP"""
-        return cls(logindn=None, password=None, uri=uri)
+        return cls(logindn=None, password=None, uri=uri, lazy=lazy)
 
     @classmethod
     def set_connection(cls, conn):
@@ -164,200 +265,440 @@ class BaseConnection(object):
         Return the ldap connection that was set
 
         If the connection object has not been set when this method is
-        called, then create and set an anonymous connection object.
+        called, then create and set an anonymous connection object.  It
+        only binds once it is used.
         """
         try:
             return cls.conn
         except AttributeError:
-            cls.set_connection(cls.connect_anon())
+            cls.set_connection(cls.connect_anon(lazy=True))
             return cls.conn
 
+    @classmethod
+    def flush_cache(cls):
+        """Drop all cached search and existence results."""
+        cls._result_cache.clear()
+        cls._negative_cache.clear()
+
+    def invalidate(self, dn):
+        """Drop the cached results that a change to ``dn`` may have staled."""
+        self._result_cache.invalidate(dn)
+        self._negative_cache.invalidate(dn)
+
+    def _cache_get(self, key):
+        result = self._result_cache.get(key)
+        if result is None:
+            result = self._negative_cache.get(key)
+        if result is None:
+            return None
+        return copy.deepcopy(result)
+
+    def _cache_set(self, key, result):
+        if result:
+            cache, ttl = self._result_cache, self.cache_ttl
+        else:
+            cache, ttl = self._negative_cache, self.negative_cache_ttl
+        if ttl:
+            cache.set(key, copy.deepcopy(result), ttl)
+
     def __str__(self):
-        return self.uri + ' as ' + self.whoami()
+        return '%s as %s' % (self.uri, self.dn)
+
+    def __enter__(self):
+        return self
 
-    def __unicode__(self):
-        return self.uri + ' as ' + self.whoami()
+    def __exit__(self, *exc_info):
+        self.close()
 
-    def __del__(self):
-        self.ldaps.unbind_s()
+    def close(self):
+        """
+        Unbind from the LDAP.
+
+        This happens automatically once the connection is garbage collected,
+        but calling it (or using the connection as a context manager) closes
+        the sockets promptly.  It is safe to call more than once, but the
+        connection cannot be used afterwards.
+        """
+        self._finalizer()
 
     def is_anonymous(self):
         return self.dn is None
 
+    def authenticate(self, logindn, password):
+        """
+        Return True if ``logindn`` can bind with ``password``; False otherwise.
+
+        This connection stays bound as its own identity.
+        """
+        return self._pool.bind_and_revert(self._fully_qualify_dn(logindn),
+                                          password)
+
     def whoami(self):
         """
         Return the full DN of the entity that is bound to this connection
 
         Return None if this is an anonymous bind.
         """
-        answer = self.ldaps.whoami_s()
+        return self.dn
+
+    def _whoami_s(self):
+        """Ask the server who we are bound as."""
+        with self._pool.checkout() as ldaps:
+            answer = ldaps.whoami_s()
         if answer is None or answer == '':
             return None  # anonymous bind
 
-        if re.search('^dn:', answer):
-            return answer.replace('dn:', '', 1)
-        if re.search('^u:', answer):
-            return answer.replace('u:', '', 1)
+        if answer.startswith('dn:'):
+            return answer[3:]
+        if answer.startswith('u:'):
+            return answer[2:]
 
         return None  # should be virtually unreachable
 
     def whoami_short(self):
-        dn = self.whoami()
+        dn = self.dn
         if dn is None:
             return dn
         parts = dn.split(',')
         return parts[0].split('=')[1]
 
-    def exists(self, dn):
-        scope = ldap.SCOPE_BASE
+    def exists(self, dn, use_cache=True):
+        """
+        Return True if an entry exists at ``dn``; False otherwise.
+
+        If ``use_cache`` is False, the server is asked even when a cached
+        answer is available.
+        """
         try:
             ldap.dn.explode_dn(dn)
         except ldap.DECODING_ERROR:
             return False
+        key = (dn, 'exists', self.uri, self._cache_identity)
+        if use_cache:
+            cached = self._cache_get(key)
+            if cached is not None:
+                return cached
         try:
-            self.ldaps.search_s(dn, scope)
-            return True
+            with self._pool.checkout() as ldaps:
+                result = self._exists_s(ldaps, dn)
         except ldap.NO_SUCH_OBJECT:
-            return False
+            result = False
+        self._cache_set(key, result)
+        return result
+
+    def _exists_s(self, ldaps, dn):
+        """
+        Ask the server whether ``dn`` exists.
+
+        A compare answers without sending any attributes back.  Whether the
+        entry has objectClass top does not matter: any answer at all means
+        that the entry is there.  Servers that refuse the compare (e.g. for
+        lack of compare access) are asked with a base search for no
+        attributes instead.
+        """
+        try:
+            ldaps.compare_s(dn, 'objectClass', b'top')
+        except (ldap.NO_SUCH_OBJECT, ldap.INVALID_DN_SYNTAX, ldap.SERVER_DOWN):
+            raise
+        except ldap.LDAPError:
+            ldaps.search_s(dn, ldap.SCOPE_BASE, attrlist=['1.1'])
+        return True
 
     def search(self, basedn=None, scope=ldap.SCOPE_SUBTREE,
-               filter='(objectClass=*)', attrlist=None):
+               filter='(objectClass=*)', attrlist=None, page_size=None,
+               use_cache=True):
         """
         Perform an LDAP search operation.
 
         Optional attributes are a basedn, a scope, and a filter.  Use
         ldap.SCOPE_BASE to search the object represented by the basedn itself.
         The default search scope is ldap.SCOPE_SUBTREE.
+
+        If a page_size is given, the results are retrieved in pages of that
+        many entries using the simple paged results control, which keeps
+        large searches under the server's size limit.
+
+        Results are served from the cache when an identical search was
+        performed recently, unless ``use_cache`` is False.
         """
         if basedn is None:
             basedn = self.basedn
         if attrlist is None:
             attrlist = self.__class__.attrlist
-        log.debug('Searching with filter %s in %s under scope %s' %
-                  (filter, basedn, scope))
+        key = (basedn, scope, filter, tuple(attrlist), self.uri,
+               self._cache_identity)
+        if use_cache:
+            result = self._cache_get(key)
+            if result is not None:
+                log.debug('Cached result for filter %s in %s under scope %s',
+                          filter, basedn, scope)
+                return result
+        result = self._search_s(basedn, scope, filter, attrlist, page_size)
+        self._cache_set(key, result)
+        return result
+
+    def asearch(self, requests):
+        """
+        Perform several independent searches concurrently.
+
+        Each request is a tuple of positional arguments for search(), e.g.
+        (basedn, scope, filter, attrlist).  Up to max_pool_size searches are
+        in flight at once, each on its own pooled handle.
+
+        Return a list holding, in the order of the requests, either the
+        results of each search or the exception that it raised.
+        """
+        def run(request):
+            try:
+                return self.search(*request)
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=self.max_pool_size) as executor:
+            return list(executor.map(run, requests))
+
+    def search_many(self, attr, values, basedn=None, scope=ldap.SCOPE_SUBTREE,
+                    attrlist=None, chunk_size=500, page_size=1000):
+        """
+        Look up many entries by the value of a single attribute.
+
+        Rather than searching once per value, the values are OR'ed together
+        into a filter like (|(uid=a)(uid=b)...), chunk_size values at a time.
+
+        Return a dict mapping each value that was found to its (dn, entry)
+        tuple.  Values are matched case-insensitively.
+        """
+        wanted = {v.lower(): v for v in values}
+        attr_lower = attr.lower()
+        found = {}
+        for chunk in chunks_of(list(wanted.values()), chunk_size):
+            filter = '(|%s)' % ''.join(
+                filter_format('(%s=%s)', [attr, v]) for v in chunk)
+            results = self.search(basedn=basedn, scope=scope, filter=filter,
+                                  attrlist=attrlist, page_size=page_size)
+            for dn, entry in results:
+                vals = entry.get(attr)
+                if vals is None:
+                    # attribute names are case-insensitive, and the server
+                    # may spell this one differently than the caller did
+                    vals = next((v for k, v in entry.items()
+                                 if k.lower() == attr_lower), [])
+                for val in vals:
+                    value = wanted.get(val.decode('utf-8').lower())
+                    if value is not None and value not in found:
+                        found[value] = (dn, entry)
+        return found
+
+    def _search_s(self, basedn, scope, filter, attrlist, page_size=None):
+        """Perform the search against the server, bypassing the cache."""
+        log.debug('Searching with filter %s in %s under scope %s',
+                  filter, basedn, scope)
         try:
-            return self.ldaps.search_s(basedn, scope, filter, attrlist=attrlist)
+            return self._checked_out_search(basedn, scope, filter, attrlist,
+                                            page_size)
         except ldap.SERVER_DOWN:
             log.error('Could not contact the LDAP service.  Server down.')
             # sometimes connections go stale if the server has restarted.
+            # The pool has thrown away its stale handles, so retry the
+            # search on a freshly bound one.
+            log.warning('Retrying the search on a new connection.')
 
-            # there is nothing we can do for un-anonymous connections.
-            if not self.is_anonymous():
-                raise
-
-            # if the connection is anonymous, we will retry the search
-            # using a fresh connection.
-            log.warning('Recreating a new anonymous connection.')
-
-            cls = self.__class__
-            new_conn = cls.connect_anon()
-
-            # if this search still fails we won't catch it.  If we get
-            # past that point, then set the new anon connection and
-            # return the result
+            # if this search still fails we won't catch it.
             #
             # Nota bene: this code is intentionally not recursive!
-            result = new_conn.ldaps.search_s(basedn, scope, filter,
-                                             attrlist=attrlist)
-
-            cls.set_connection(new_conn)
-            return result
+            return self._checked_out_search(basedn, scope, filter, attrlist,
+                                            page_size)
+
+    def _checked_out_search(self, basedn, scope, filter, attrlist, page_size):
+        """Run a search on a handle checked out of the pool."""
+        with self._pool.checkout() as ldaps:
+            if not page_size:
+                return ldaps.search_s(basedn, scope, filter, attrlist=attrlist)
+
+            control = SimplePagedResultsControl(True, size=page_size, cookie='')
+            results = []
+            while True:
+                msgid = ldaps.search_ext(basedn, scope, filter,
+                                         attrlist=attrlist,
+                                         serverctrls=[control])
+                _, data, _, serverctrls = ldaps.result3(msgid)
+                results.extend(data)
+                cookies = [
+                    c.cookie for c in serverctrls
+                    if c.controlType == SimplePagedResultsControl.controlType
+                ]
+                if not cookies or not cookies[0]:
+                    return results
+                control.cookie = cookies[0]
 
     def add(self, dn, attrs):
+        addlist = modlist.addModlist(attrs)
         try:
-            self.ldaps.add_s(dn, modlist.addModlist(attrs))
-            log.debug('add %s' % dn)
+            with self._pool.checkout() as ldaps:
+                ldaps.add_s(dn, addlist)
+            self.invalidate(dn)
+            log.debug('add %s', dn)
             return True
         except ldap.INVALID_DN_SYNTAX:
             raise
         except ldap.NO_SUCH_OBJECT:
             raise AddDNFailed(dn)
         except ldap.LDAPError:
-            log.error('add %s failed' % dn, exc_info=False)
+            log.error('add %s failed', dn, exc_info=False)
             raise
 
+    def add_many(self, entries):
+        """
+        Add several entries, pipelining the requests.
+
+        Each entry is a (dn, attrs) tuple as would be passed to add().  The
+        entries are sent in bursts of up to ``add_pipeline_depth`` requests
+        on one pooled handle, without waiting for each answer before sending
+        the next; up to max_pool_size bursts are in flight at once.
+
+        Return a list holding, in the order of the entries, either True or
+        the exception that the add raised.
+        """
+        entries = [(i, dn, modlist.addModlist(attrs))
+                   for i, (dn, attrs) in enumerate(entries)]
+        results = [None] * len(entries)
+        bursts = list(chunks_of(entries, self.add_pipeline_depth))
+        if len(bursts) == 1:
+            self._add_burst(bursts[0], results)
+        elif bursts:
+            with ThreadPoolExecutor(max_workers=self.max_pool_size) as executor:
+                for _ in executor.map(
+                        lambda burst: self._add_burst(burst, results), bursts):
+                    pass
+        return results
+
+    def _add_burst(self, burst, results):
+        """
+        Send every add in ``burst``, a list of (index, dn, addlist) tuples,
+        then collect the answers into ``results``.
+        """
+        try:
+            with self._pool.checkout() as ldaps:
+                pending = []
+                for i, dn, addlist in burst:
+                    try:
+                        pending.append((i, dn, ldaps.add_ext(dn, addlist)))
+                    except ldap.SERVER_DOWN:
+                        raise
+                    except ldap.LDAPError as e:
+                        results[i] = self._add_failure(dn, e)
+                for i, dn, msgid in pending:
+                    try:
+                        ldaps.result3(msgid)
+                    except ldap.SERVER_DOWN:
+                        raise
+                    except ldap.LDAPError as e:
+                        results[i] = self._add_failure(dn, e)
+                    else:
+                        self.invalidate(dn)
+                        log.debug('add %s', dn)
+                        results[i] = True
+        except ldap.SERVER_DOWN as e:
+            # the rest of the burst was lost with the connection
+            for i, dn, _ in burst:
+                if results[i] is None:
+                    results[i] = e
+
+    def _add_failure(self, dn, e):
+        """Return the exception that add() would raise for ``e``."""
+        if isinstance(e, ldap.NO_SUCH_OBJECT):
+            return AddDNFailed(dn)
+        if not isinstance(e, ldap.INVALID_DN_SYNTAX):
+            log.error('add %s failed', dn, exc_info=False)
+        return e
+
     def delete(self, dn):
         try:
-            self.ldaps.delete_s(dn)
-            log.debug('delete %s' % dn)
+            with self._pool.checkout() as ldaps:
+                ldaps.delete_s(dn)
+            self.invalidate(dn)
+            log.debug('delete %s', dn)
             return True
         except ldap.LDAPError:
-            log.error('delete %s failed' % dn, exc_info=False)
+            log.error('delete %s failed', dn, exc_info=False)
             return False
 
-    def modify_attr(self, dn, attribute, value):
-        tuple = [(ldap.MOD_REPLACE, attribute, value)]
+    def _modify(self, dn, mods, action, *action_args):
+        """
+        Apply the list of ``(op, attribute, value)`` modifications to ``dn``
+        in a single request.
+
+        ``action`` is a format string, filled in from ``action_args``, that
+        describes the modification in log messages.
+        """
         try:
-            self.ldaps.modify_s(dn, tuple)
-            log.debug('mod attr %s on %s' % (attribute, dn))
+            with self._pool.checkout() as ldaps:
+                ldaps.modify_s(dn, mods)
+            self.invalidate(dn)
+            log.debug(action + ' on %s', *action_args, dn)
             return True
         except ldap.NO_SUCH_OBJECT:
             raise NoSuchDN(dn=dn)
         except ldap.TYPE_OR_VALUE_EXISTS:
+            _, attribute, value = _offending_mod(
+                mods, ldap.MOD_ADD, ldap.MOD_REPLACE)
             raise DuplicateValue(attr=attribute, value=value)
+        except ldap.NO_SUCH_ATTRIBUTE:
+            _, attribute, value = _offending_mod(mods, ldap.MOD_DELETE)
+            raise NoSuchAttrValue(dn=dn, attribute=attribute, value=value)
         except ldap.LDAPError:
-            log.error('mod attr %s on %s failed' % (attribute, dn),
+            log.error(action + ' on %s failed', *action_args, dn,
                       exc_info=False)
             raise
-            return False
+
+    def modify(self, dn, mods):
+        """
+        Apply a list of ``(op, attribute, value)`` modifications to ``dn``.
+
+        The server applies all of them or none of them.
+        """
+        return self._modify(dn, mods, 'modify %s',
+                            ', '.join(attribute for _, attribute, _ in mods))
+
+    def modify_attr(self, dn, attribute, value):
+        return self._modify(dn, [(ldap.MOD_REPLACE, attribute, value)],
+                            'mod attr %s', attribute)
 
     def add_attr(self, dn, attribute, value):
-        tuple = [(ldap.MOD_ADD, attribute, value)]
-        try:
-            self.ldaps.modify_s(dn, tuple)
-            log.debug('add attr %s on %s' % (attribute, dn))
-            return True
-        except ldap.NO_SUCH_OBJECT:
-            raise NoSuchDN(dn=dn)
-        except ldap.TYPE_OR_VALUE_EXISTS:
-            raise DuplicateValue(attr=attribute, value=value)
-        except ldap.LDAPError:
-            log.error('add attr %s on %s failed' % (attribute, dn),
-                      exc_info=False)
-            raise
-            return False
+        return self._modify(dn, [(ldap.MOD_ADD, attribute, value)],
+                            'add attr %s', attribute)
 
     def delete_attr(self, dn, attribute, value=None):
-        tuple = [(ldap.MOD_DELETE, attribute, value)]
-        try:
-            self.ldaps.modify_s(dn, tuple)
-            log.debug('del attr %s and value %s on %s' %
-                      (attribute, dn, value))
-            return True
-        except ldap.NO_SUCH_OBJECT:
-            raise NoSuchDN(dn=dn)
-        except ldap.NO_SUCH_ATTRIBUTE:
-            raise NoSuchAttrValue(dn=dn, attribute=attribute, value=value)
-        except ldap.LDAPError:
-            log.error('del attr %s and value %s on %s failed' %
-                      (attribute, value, dn), exc_info=False)
-            raise
-            return False
+        return self._modify(dn, [(ldap.MOD_DELETE, attribute, value)],
+                            'del attr %s and value %s', attribute, value)
 
     def ldif(self, filter):
         """Return an LDIF string of all results returned for the given filter"""
-        log.debug("Using search filter : %s" % filter)
+        return ''.join(self.ldif_iter(filter))
+
+    def ldif_iter(self, filter):
+        """
+        Yield the LDIF string of each result returned for the given filter
+
+        This is useful for streaming a large result set out to a file without
+        holding the whole LDIF in memory at once.
+        """
+        log.debug("Using search filter : %s", filter)
 
         results = self.search(filter=filter)
         if len(results) == 1:
             log.info("Found 1 entry")
         else:
-            log.info("Found %s entries" % len(results))
+            log.info("Found %s entries", len(results))
 
-        output = ''
         for dn, entry in results:
-            output += "-" * 72 + "\n"
-            output += "DN: %s\n" % dn
-            length = 0
-            # first loop the attrs to figure out what the largest string is
-            for attr in entry.keys():
-                if len(attr) > length:
-                    length = len(attr)
-            # add one more for padding
-            length += 1
+            # pad the attribute names out to the longest one plus one
+            length = max(map(len, entry), default=0) + 1
             output_format = '%%%ds: %%s\n' % length
+            parts = ["-" * 72 + "\n", "DN: %s\n" % dn]
             for attr, values in entry.items():
                 for val in values:
-                    output += output_format % (attr, val.decode())
-            output += "\n"
-        return output
+                    parts.append(
+                        output_format % (attr, val.decode('utf-8', 'replace')))
+            parts.append("\n")
+            yield ''.join(parts)
@@ -1,10 +1,37 @@
+from collections import Counter
+
+
 class LdapperError(Exception):
 
     """Base class for exceptions in this module.
 
-        A msg MUST be provided.
+        A msg MUST be provided, either by setting it or by defining a _fmt
+        format string that is filled in from _fmt_args().  A _fmt message
+        is only formatted once something asks for it, and then kept.
     """
 
+    __slots__ = ('_msg',)
+
+    _fmt = None
+
+    def _fmt_args(self):
+        return ()
+
+    def _format(self):
+        return self._fmt % self._fmt_args()
+
+    @property
+    def msg(self):
+        try:
+            return self._msg
+        except AttributeError:
+            self._msg = self._format()
+            return self._msg
+
+    @msg.setter
+    def msg(self, value):
+        self._msg = value
+
     def __str__(self):
         return '(%s) %s' % (self.__class__.__name__, self.msg)
 
@@ -18,9 +45,15 @@ class AddDNFailed(LdapperError):
        msg -- explanation of the error
     """
 
+    __slots__ = ('dn',)
+
+    _fmt = 'Unable to add the DN %s to LDAP'
+
     def __init__(self, dn):
         self.dn = dn
-        self.msg = 'Unable to add the DN %s to LDAP' % dn
+
+    def _fmt_args(self):
+        return (self.dn,)
 
 
 class ArgumentError(LdapperError):
@@ -31,6 +64,8 @@ class ArgumentError(LdapperError):
         msg -- explanation of the error
     """
 
+    __slots__ = ()
+
     def __init__(self, msg):
         self.msg = msg
 
@@ -44,18 +79,23 @@ class DuplicateValue(LdapperError):
        value -- Attribute value
     """
 
+    __slots__ = ('attr', 'original_value', 'offending_values')
+
+    _fmt = 'Attribute "%s" has duplicate value(s): %s'
+
     def __init__(self, attr, value):
         self.attr = attr
         self.original_value = value
         if isinstance(value, list):
-            dups = [x for x in value if value.count(x) >= 2]
-            self.offending_values = list(set(dups))
+            counts = Counter(value)
+            self.offending_values = [x for x, n in counts.items() if n >= 2]
         else:
             # I'm not sure when something other than a list could have a
             # duplicate value, but just in case...
             self.offending_values = value
-        self.msg = 'Attribute "%s" has duplicate value(s): %s' % (
-            attr, self.offending_values)
+
+    def _fmt_args(self):
+        return (self.attr, self.offending_values)
 
 
 class NoSuchAttrValue(LdapperError):
@@ -69,11 +109,17 @@ class NoSuchAttrValue(LdapperError):
         msg -- explanation of the error
     """
 
+    __slots__ = ('dn', 'attribute', 'value')
+
+    _fmt = 'DN %s does not have %s %s'
+
     def __init__(self, dn, attribute, value):
         self.dn = dn
         self.attribute = attribute
         self.value = value
-        self.msg = 'DN %s does not have %s %s' % (dn, attribute, value)
+
+    def _fmt_args(self):
+        return (self.dn, self.attribute, self.value)
 
 
 class NoSuchDN(LdapperError):
@@ -85,9 +131,15 @@ class NoSuchDN(LdapperError):
         msg -- explanation of the error
     """
 
+    __slots__ = ('dn',)
+
+    _fmt = 'DN %s does not exist.'
+
     def __init__(self, dn):
         self.dn = dn
-        self.msg = 'DN %s does not exist.' % dn
+
+    def _fmt_args(self):
+        return (self.dn,)
 
 
 class InvalidDN(LdapperError):
@@ -99,11 +151,16 @@ class InvalidDN(LdapperError):
        msg -- explanation of the error
     """
 
+    __slots__ = ('obj', 'name', 'dn')
+
     def __init__(self, obj, name, dn):
         self.obj = obj
         self.name = name
         self.dn = dn
+
+    def _format(self):
         if self.obj and self.name:
-            self.msg = '%s %s has an invalid dn format: %s' % (obj, name, dn)
+            return '%s %s has an invalid dn format: %s' % (
+                self.obj, self.name, self.dn)
         else:
-            self.msg = 'Invalid DN format: %s' % dn
+            return 'Invalid DN format: %s' % self.dn
@@ -1,8 +1,9 @@
+import sys
+
 from ldapper.utils import (
     ad_date_parse,
     dn_attribute,
-    get_attr,
-    get_attrlist,
+    generalized_time_parse,
     to_list,
 )
 
@@ -17,6 +18,11 @@ class Field(object):
     and converting it to a representation suitable for LDAP modifications.
     """
 
+    # Fields are read for every attribute of every entry that is loaded, so
+    # keep their attributes in slots rather than a per-instance __dict__.
+    # Subclasses declare empty __slots__ to keep it that way.
+    __slots__ = ('ldap', 'optional', 'readonly', 'printable', 'primary')
+
     derived = False
     """
     Is the ``Field`` derived/inferred/computed?
@@ -33,6 +39,12 @@ class Field(object):
     # set by the user.  Things like createTimestamp, modifiedTimestamp
     system = False
 
+    # populate() reads every value of the attribute when _multivalued is
+    # set, otherwise just the first.  Values are decoded from UTF-8 unless
+    # _decode is unset.
+    _multivalued = False
+    _decode = True
+
     def __init__(self, ldap, optional=False, readonly=False, printable=True,
                  primary=False):
         """
@@ -47,7 +59,10 @@ class Field(object):
             primary - True if this is the field that primarily identifies
                     the object.  Defaults to False.  Can only be one per class.
         """
-        self.ldap = ldap
+        # names that are not identifiers (msDS-..., -fake) are not interned
+        # by the compiler; interning them keeps the dict lookups that use
+        # them on the identity fast path.
+        self.ldap = sys.intern(ldap)
         self.optional = optional
         self.readonly = readonly
         self.printable = printable
@@ -57,6 +72,37 @@ class Field(object):
         """The value used for the field if none is provided."""
         return None
 
+    def populate(self, dn, entry):
+        """Return the value for this field out of an LDAP result entry."""
+        return self._from_values(entry.get(self.ldap))
+
+    def _from_values(self, vals):
+        """
+        Return the value for this field from the raw values of its attribute
+        in an entry, or from None if the entry does not have the attribute.
+
+        This is populate() for the many fields that only need their own
+        attribute, which lets an LDAPNode read an entry in one pass.
+        """
+        if self._multivalued:
+            if vals is None:
+                return []
+            if vals and self._decode:
+                # bytes.decode() defaults to UTF-8
+                return list(map(bytes.decode, vals))
+            # a copy, so that changing the value leaves the entry alone
+            return list(vals)
+        if vals is None:
+            return None
+        val = vals[0]
+        if val and self._decode:
+            return val.decode()
+        return val
+
+    # what an LDAPNode reads an entry with.  A field may skip work here that
+    # its coerce_for_python() makes unnecessary.
+    _from_entry_values = _from_values
+
     def coerce_for_python(self, value):
         """
         Returns a transformed value for the ``value`` provided.
@@ -71,12 +117,22 @@ class Field(object):
 
 class IntegerField(Field):
 
-    def populate(self, dn, entry):
-        val = get_attr(entry, self.ldap)
-        if val:
-            return val.decode('utf-8')
-        else:
-            return val
+    __slots__ = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # a subclass's own coerce_for_python() is given str, just as it is
+        # through populate(), however the value is read.
+        if cls.coerce_for_python is not IntegerField.coerce_for_python and \
+                '_from_entry_values' not in cls.__dict__:
+            cls._from_entry_values = Field._from_values
+
+    def _from_entry_values(self, vals):
+        # int() parses the raw bytes directly, so there is no need to decode
+        # the value before coerce_for_python() gets it.
+        if vals is None:
+            return None
+        return vals[0]
 
     def coerce_for_python(self, value):
         if value is None and self.optional:
@@ -84,6 +140,8 @@ class IntegerField(Field):
         try:
             return int(value)
         except ValueError:
+            if isinstance(value, bytes):
+                value = value.decode()
             msg = "%s must be an int: got %s" % (self.ldap, value)
             raise ValueError(msg)
         except TypeError:
@@ -99,15 +157,15 @@ class IntegerField(Field):
 
 class StringField(Field):
 
-    def populate(self, dn, entry):
-        val = get_attr(entry, self.ldap)
-        if val:
-            return val.decode('utf-8')
-        else:
-            return val
+    __slots__ = ()
 
     def coerce_for_python(self, value):
-        if type(value) == int:
+        # populate() has already decoded values read from the LDAP
+        if type(value) is str:
+            return value
+        if isinstance(value, bytes):
+            return value.decode()
+        if isinstance(value, int):
             return str(value)
         return value
 
@@ -124,21 +182,19 @@ class ListField(Field):
 
     """Lists can only hold Strings at this time."""
 
+    __slots__ = ()
+
+    _multivalued = True
+
     def default_value(self):
         return []
 
-    def populate(self, dn, entry):
-        vals = get_attrlist(entry, self.ldap)
-        if vals:
-            return [v.decode('utf-8') for v in vals]
-        else:
-            return vals
-
     def coerce_for_python(self, value):
         return to_list(value)
 
     def sanitize_for_ldap(self, val):
-        return [v.encode('utf-8') for v in val]
+        # str.encode() defaults to UTF-8
+        return list(map(str.encode, val))
 
 
 class DNPartField(Field):
@@ -154,6 +210,8 @@ class DNPartField(Field):
     a part of the DN.
     """
 
+    __slots__ = ()
+
     derived = True
 
     def populate(self, dn, entry):
@@ -174,8 +232,9 @@ class DNPartField(Field):
 
 class BinaryField(Field):
 
-    def populate(self, dn, entry):
-        return get_attr(entry, self.ldap)
+    __slots__ = ()
+
+    _decode = False
 
     def sanitize_for_ldap(self, val):
         return val
@@ -186,6 +245,8 @@ class SystemField(Field):
     Meant for ldap attributes that are system-managed by the LDAP server.
     """
 
+    __slots__ = ()
+
     system = True
 
     def sanitize_for_ldap(self, val):
@@ -197,6 +258,20 @@ class Win32TimestampField(StringField):
     The 18-digit Active Directory timestamps, also named 'Windows NT time format'
     """
 
+    __slots__ = ()
+
     def coerce_for_python(self, value):
         if value:
             return ad_date_parse(value)
+
+
+class GeneralizedTimeField(StringField):
+    """
+    LDAP GeneralizedTime values, such as createTimestamp and modifyTimestamp
+    """
+
+    __slots__ = ()
+
+    def coerce_for_python(self, value):
+        if value:
+            return generalized_time_parse(value)
@@ -1,8 +1,11 @@
 import logging
 from functools import partial
+from itertools import islice
+from operator import attrgetter
 import datetime
 
 import ldap
+from ldap.dn import str2dn
 
 from ldapper.exceptions import ArgumentError
 from ldapper.fields import Field, BinaryField
@@ -12,6 +15,9 @@ from ldapper.utils import (
     inflect_given_cardinality,
     build_ldap_filter,
     list_items_to_sentence,
+    compile_format,
+    escape_filter_value,
+    parse_format,
     middle_dn,
     print_word_list,
     remove_empty_strings,
@@ -28,6 +34,24 @@ DEFAULT_OPTIONS = (
 )
 
 
+def _readonly_property(name):
+    """
+    Return a property for the readonly field ``name``.
+
+    The value lives in the attribute ``__name``.  Setting or deleting the
+    property only logs a warning.
+    """
+    def fset(self, value):
+        self.logger.warning("Cannot modify read-only field '%s'" % name)
+
+    def fdel(self):
+        self.logger.warning("Cannot delete read-only field '%s'" % name)
+
+    # reads are far more common than writes, so the getter is an
+    # attrgetter, which is implemented in C.
+    return property(attrgetter('__' + name), fset, fdel, '%s field' % name)
+
+
 class Options:
 
     def __init__(self, meta, cls_name):
@@ -40,11 +64,28 @@ class Options:
         self.searchable_fields = []
         self.human_readable_name = cls_name
 
+        self.dn_format = None
+
         if meta:
             for attr_name in DEFAULT_OPTIONS:
                 if hasattr(self.meta, attr_name):
                     setattr(self, attr_name, getattr(self.meta, attr_name))
 
+        # these get formatted for every object, so parse them just once
+        self.compiled_dn_format = compile_format(self.dn_format)
+        self.compiled_primary_dnprefix = compile_format(self.primary_dnprefix)
+
+        # _dn() fills this template straight from the instance's attributes,
+        # with the base DN as the last field, so no mapping is built and no
+        # format string is parsed per object.  It stays None when dn_format
+        # can only be applied with the % operator.
+        self.dn_template = None
+        self.dn_template_attrs = ()
+        parsed = parse_format(self.dn_format) if self.dn_format else None
+        if parsed is not None:
+            template, self.dn_template_attrs = parsed
+            self.dn_template = template + ',{}'
+
 
 class LDAPNodeBase(type):
 
@@ -74,47 +115,112 @@ class LDAPNodeBase(type):
                     # out: if a Field is readonly, we create it as a property.
                     # This lets us control further modification of the field.
 
-                    # name of the concrete attr that will hold the value
-                    ro_name = '__' + name
-
-                    # we create the fget, fset, and fdel functions needed for
-                    # a property.  Closures in Python are late-binding, so we
-                    # use partial function application to "capture" the
-                    # correct value of `name` right here and now.
-
-                    def _fget(name, self):
-                        return getattr(self, name)
-
-                    def _fset(name, self, value):
-                        self.logger.warning("Cannot modify read-only field '%s'" % name)
-
-                    def _fdel(name, self):
-                        self.logger.warning("Cannot delete read-only field '%s'" % name)
-
-                    fget = partial(_fget, ro_name)
-                    fset = partial(_fset, name)
-                    fdel = partial(_fdel, name)
-                    doc = '%s field' % name
-
-                    prop = property(fget, fset, fdel, doc)
-
+                    # The property is built by a separate function so that
+                    # its closures capture this iteration's `name`; closures
+                    # defined inside this loop would all see the last one.
+                    #
                     # set `name` to be our property
                     # set `__name` to be an initial value
-                    setattr(new_cls, name, prop)
-                    setattr(new_cls, ro_name, attr.default_value())
+                    setattr(new_cls, name, _readonly_property(name))
+                    setattr(new_cls, '__' + name, attr.default_value())
                 else:
+                    # The default is a class attribute, and values set on
+                    # an object land in its __dict__.  Reading them is a
+                    # plain dict lookup with no descriptor involved.
+                    # __slots__ would clash with these defaults and with
+                    # filling objects from the LDAP via __dict__.update().
                     setattr(new_cls, name, attr.default_value())
 
         # at this point the parent fields and the immediate fields have both been
         # merged into fields.
 
         # construct the attrlist. Use to ask ldap for specific attrs to return
-        new_cls._attrlist = [f.ldap for f in fields.values()]
+        new_cls._attrlist = tuple(f.ldap for f in fields.values())
+        # maps field names to their ldap names, for compiling queries
+        new_cls._field_ldap_names = {n: f.ldap for n, f in fields.items()}
 
         new_cls._system_fields = {n: f for n, f in fields.items() if f.system}
         new_cls._non_system_fields = {n: f for n, f in fields.items() if not f.system}
         new_cls._fields = fields
 
+        # tuples of the names (and for writing, the ldap names and
+        # sanitizers) that the instance methods loop over, so that they do
+        # not have to be recomputed on every call.
+        new_cls._field_names = tuple(fields)
+        new_cls._required_field_names = frozenset(
+            n for n, f in fields.items() if not f.optional)
+        new_cls._non_system_field_names = tuple(new_cls._non_system_fields)
+        # returns the values of the non-system fields in one call, for __eq__
+        if new_cls._non_system_field_names:
+            new_cls._non_system_values = staticmethod(
+                attrgetter(*new_cls._non_system_field_names))
+        else:
+            new_cls._non_system_values = staticmethod(lambda obj: ())
+        new_cls._pretty_print_order = (
+            new_cls._non_system_field_names + tuple(new_cls._system_fields))
+        # pretty_print() lines up every field name in the class, so its
+        # formats only depend on the class.  The padding is one more than
+        # the longest name.
+        length = max(map(len, fields), default=0) + 1
+        bolded_length = max(map(len, map(bolded, fields)), default=0) + 1
+        new_cls._pretty_print_formats = (
+            79 - length - 1,
+            '\n%%%ds: %%s' % bolded_length,
+            '\n%%%ds:%%s' % bolded_length,
+            '\n%s %%s' % (' ' * length),
+        )
+        # for each field, the instance attribute that holds its value (the
+        # hidden one for readonly fields) and how to read it out of an
+        # entry.  Fields that read just their own attribute are given its
+        # raw values directly; the ldap name is None for the others (such as
+        # DNPartField), which are given the whole dn and entry.
+        entry_fields = []
+        for n, f in fields.items():
+            attr = '__' + n if f.readonly else n
+            if type(f).populate is Field.populate:
+                entry_fields.append(
+                    (attr, f.ldap, f._from_entry_values, f.coerce_for_python))
+            else:
+                entry_fields.append(
+                    (attr, None, f.populate, f.coerce_for_python))
+        new_cls._entry_fields = tuple(entry_fields)
+        new_cls._hashable_field_names = tuple(
+            n for n, f in new_cls._non_system_fields.items()
+            if not f._multivalued)
+        # returns the tuple of those fields' values in one call, for __hash__
+        hashable = new_cls._hashable_field_names
+        if len(hashable) > 1:
+            new_cls._hashable_values = staticmethod(attrgetter(*hashable))
+        elif hashable:
+            getter = attrgetter(hashable[0])
+            new_cls._hashable_values = staticmethod(lambda obj: (getter(obj),))
+        else:
+            new_cls._hashable_values = staticmethod(lambda obj: ())
+        # derived fields do not exist as concrete fields on the entry, so
+        # they never show up in diff()
+        new_cls._diff_fields = tuple(
+            (n, f.ldap) for n, f in new_cls._non_system_fields.items()
+            if not f.derived)
+        new_cls._writable_fields = tuple(
+            (n, f.ldap, f.sanitize_for_ldap)
+            for n, f in new_cls._non_system_fields.items()
+            # ignore attributes starting with a "-"
+            # also ignore fields that are derived (like DNPartField)
+            if not n.startswith('-') and not f.derived)
+
+        # resolve the connection accessor once, rather than on every lookup
+        connection = getattr(new_cls, 'connection', None)
+        if connection is not None:
+            new_cls._get_connection = staticmethod(connection.get_connection)
+
+        # The objectClass filter only depends on the Meta options, so build
+        # it once.  Classes without objectclasses (mixins, connection
+        # holders) cannot have one; objectclass_filter() raises for those.
+        try:
+            new_cls._objectclass_filter = new_cls._build_objectclass_filter()
+        except ValueError:
+            new_cls._objectclass_filter = None
+
         # Ensure that there is never more than one primary Field
         #
         # It might be acceptable for a class to have no primary fields
@@ -125,9 +231,23 @@ class LDAPNodeBase(type):
         if len(primaries) > 1:
             emsg = "%s can only have at most one primary field." % new_cls.__name__
             raise ValueError(emsg)
+        # __eq__ compares the primary values first, as they tell most
+        # unequal objects apart without reading every other field
+        new_cls._primary_value = None
         if primaries:
-            new_cls.primary = list(primaries.keys())[0]
-            new_cls._primary_field = list(primaries.values())[0]
+            new_cls.primary, new_cls._primary_field = \
+                next(iter(primaries.items()))
+            if not new_cls._primary_field.system:
+                new_cls._primary_value = staticmethod(
+                    attrgetter(new_cls.primary))
+
+        # the filter fetch() searches with, waiting only for the primary value
+        new_cls._fetch_filter_format = None
+        if new_cls._objectclass_filter is not None and \
+                getattr(new_cls, '_primary_field', None) is not None:
+            new_cls._fetch_filter_format = '(&(%s=%%s)%s)' % (
+                new_cls._primary_field.ldap,
+                new_cls._objectclass_filter.replace('%', '%%'))
 
         # The class is now ready
         return new_cls
@@ -137,6 +257,12 @@ class LDAPNode(object, metaclass=LDAPNodeBase):
 
     sensitive_attributes = ['userPassword']
 
+    # the (dn, entry) this object was parsed from, if it was loaded by
+    # fetch() and has not been saved or deleted since.  See diff().
+    _ldap_snapshot = None
+    # the (parts, dn) pair _dn() last built
+    _dn_cache = None
+
     def __init__(self, **kwargs):
         """
         Construct a new LDAPNode.
@@ -145,12 +271,14 @@ class LDAPNode(object, metaclass=LDAPNodeBase):
             TypeError: Raised if unrecognized kwargs are passed in.
         """
         self.logger = ProxyLogger(log)
-        self.conn = self.__class__.connection.get_connection()
+        self.conn = self._get_connection()
+        self._basedn = self.conn.basedn
         self._check_required_fields_present(kwargs.keys())
 
+        fields = self._fields
         for name, value in kwargs.items():
             try:
-                field = self._fields[name]
+                field = fields[name]
             except KeyError:
                 msg = "'%s' is an invalid keyword argument for this function" % name
                 raise TypeError(msg)
@@ -167,7 +295,7 @@ class LDAPNode(object, metaclass=LDAPNodeBase):
 
     def __hash__(self):
         """
-        Return the xor of the attributes that are themselves hashable.
+        Return the hash of the tuple of attributes that are hashable.
 
         A meaningful implementation of this method is required to use sets.
 
@@ -177,23 +305,26 @@ class LDAPNode(object, metaclass=LDAPNodeBase):
         that two objects with different values in their lists could hash to
         the same value.
         """
-        hash_result = hash("LTM")
-        for attr in self._non_system_fields.keys():
-            try:
-                hash_result = hash_result ^ hash(getattr(self, attr))
-            except TypeError:
-                pass
-        return hash_result
+        vals = self._hashable_values(self)
+        try:
+            return hash(vals)
+        except TypeError:
+            # a custom single-valued field may still hold something unhashable
+            return hash(tuple(v for v in vals if v.__hash__ is not None))
 
     def __eq__(self, other):
-        if not other:
+        if other is self:
+            return True
+        if other is None or self.__class__ is not other.__class__:
             return False
-        if self.__class__ != other.__class__:
+        # hash() would read every hashable field of both objects, so the
+        # primary value is the cheaper early way out
+        primary_value = self._primary_value
+        if primary_value is not None and \
+                primary_value(self) != primary_value(other):
             return False
-        for attr in self._non_system_fields.keys():
-            if getattr(self, attr) != getattr(other, attr):
-                return False
-        return True
+        values = self._non_system_values
+        return values(self) == values(other)
 
     def __lt__(self, other):
         return getattr(self, self.primary) < getattr(other, other.primary)
@@ -208,27 +339,27 @@ class LDAPNode(object, metaclass=LDAPNodeBase):
         Unprintable attributes *are* printed for __str__, but not for
         pretty_print().
         """
-        output = "DN: %s" % self.dn
+        vals = [(attr, getattr(self, attr)) for attr in self._field_names]
         # first loop the attrs to figure out what the largest string is
-        length = max([len(attr) for attr in self._fields.keys() if getattr(self, attr)])
+        length = max([len(attr) for attr, val in vals if val])
         # add one more for padding
         length += 1
         output_format = '\n%%%ds: %%s' % length
 
-        for attr in self._fields.keys():
-            if isinstance(getattr(self, attr), list):
-                for a in getattr(self, attr):
+        # collect the lines and join them once at the end
+        output = ["DN: %s" % self.dn]
+        for attr, val in vals:
+            if isinstance(val, list):
+                for a in val:
                     if isinstance(a, LDAPNode):
-                        output += output_format % (attr, a.dnattr())
+                        output.append(output_format % (attr, a.dnattr()))
                     else:
-                        output += output_format % (attr, str(a))
-            elif isinstance(getattr(self, attr), LDAPNode):
-                output += output_format % (attr, getattr(self, attr).dnattr())
-            else:
-                if getattr(self, attr) is None:
-                    continue
-                output += output_format % (attr, str(getattr(self, attr)))
-        return output
+                        output.append(output_format % (attr, a))
+            elif isinstance(val, LDAPNode):
+                output.append(output_format % (attr, val.dnattr()))
+            elif val is not None:
+                output.append(output_format % (attr, val))
+        return ''.join(output)
 
     def pretty_print(self):
         """
@@ -236,58 +367,42 @@ class LDAPNode(object, metaclass=LDAPNodeBase):
 
         Any Fields listed as printable=False will be omitted.
         """
-        output = "DN: %s" % self.dn
-        length = 0
-        bolded_length = 0
-
-        attr_names = list(self._fields.keys())
-
-        # figure out what the longest attribute name is
-        # add one more for padding
-        length = max(len(attr) for attr in attr_names) + 1
-        bolded_length = max(len(bolded(attr)) for attr in attr_names) + 1
-
-        line_length = 79 - length - 1
-        output_format = '\n%%%ds: %%s' % bolded_length
-
-        # now that the max line length has been determined, we need to split
-        # up the system attributes from all other attributes so that we can
-        # print the system attributes last.
-        system_attr_names = [n for n, f in self._fields.items() if f.system]
-        attr_names = [a for a in attr_names if a not in system_attr_names]
-
-        for attr in attr_names + system_attr_names:
+        output = ["DN: %s" % self.dn]
+        fields = self._fields
+        (line_length, output_format, list_output_format,
+         continued_output_format) = self._pretty_print_formats
+
+        # the system attributes are printed last
+        for attr in self._pretty_print_order:
+            field = fields[attr]
+            if not field.printable:
+                continue
             val = getattr(self, attr)
             if val is None:
                 continue
 
-            field = self._fields.get(attr, None)
-            if field and not field.printable:
-                continue
-            if field and isinstance(field, BinaryField):
+            if isinstance(field, BinaryField):
                 o = 'Binary (%d bytes)' % len(val)
-                output += output_format % (bolded(attr), o)
+                output.append(output_format % (bolded(attr), o))
             elif isinstance(val, list):
                 if len(val) > 0:
                     word_list = print_word_list(val, line_length=line_length)
                     lines = word_list.split("\n")
-                    list_output_format = '\n%%%ds:%%s' % bolded_length
-                    output += list_output_format % (bolded(attr), lines[0])
+                    output.append(list_output_format % (bolded(attr), lines[0]))
                     for line in lines[1:]:
-                        tmp_output_format = '\n%s %%s' % (' ' * length)
-                        output += tmp_output_format % (line)
+                        output.append(continued_output_format % (line))
             elif isinstance(val, LDAPNode):
-                output += output_format % (bolded(attr), val.dnattr())
+                output.append(output_format % (bolded(attr), val.dnattr()))
             elif isinstance(val, datetime.datetime):
                 if val.tzinfo:
                     fmt = '%Y-%m-%d %H:%M:%S %Z'
                 else:
                     fmt = '%Y-%m-%d %H:%M:%S'
-                output += output_format % (bolded(attr), val.strftime(fmt))
+                output.append(output_format % (bolded(attr), val.strftime(fmt)))
             else:
-                output += output_format % (bolded(attr), val)
+                output.append(output_format % (bolded(attr), val))
 
-        return output
+        return ''.join(output)
 
     @property
     def hrn(self):
@@ -301,10 +416,33 @@ class LDAPNode(object, metaclass=LDAPNodeBase):
         Dynamically generate the DN for the current object based on the
         current values of the attributes involved in DN construction.
         """
-        return '{},{}'.format(self._meta.dn_format % self.dnattrs(), self.conn.basedn)
+        meta = self._meta
+        if meta.dn_template is not None:
+            values = []
+            for attr in meta.dn_template_attrs:
+                value = getattr(self, attr)
+                # for lists we will use the first value, as dnattrs() does
+                if isinstance(value, list):
+                    value = value[0]
+                values.append(value)
+            values.append(self._basedn)
+            values = tuple(values)
+            # sorting and hashing containers of nodes asks for the same DN
+            # over and over; only format it again once its parts change.
+            cached = self._dn_cache
+            if cached is not None and cached[0] == values:
+                return cached[1]
+            dn = meta.dn_template.format(*values)
+            self._dn_cache = (values, dn)
+            return dn
+        return self._meta.compiled_dn_format(self.dnattrs()) + ',' + self._basedn
 
     @property
     def dn(self):
+        """
+        The object's DN.  _dn() reuses the last one it built until the
+        values it is made from change.
+        """
         return self._dn()
 
     @dn.setter
@@ -324,16 +462,19 @@ class LDAPNode(object, metaclass=LDAPNodeBase):
         Return a hash mapping attributes to their values for attributes that
         are necessary to uniquely identify the object.  This is useful when
         constructing the DN or when calling a refetch().
+
+        These are the Meta's identifying_attrs, which may name more than
+        the primary field.
         """
         attrs = {}
         for attr in self._meta.identifying_attrs:
+            value = getattr(self, attr)
             # for lists we will use the first value
             # TODO maybe having ListFields be an identifying_attr should
             # be an error at the time of metaclass creation.
-            if isinstance(getattr(self, attr), list):
-                attrs[attr] = getattr(self, attr)[0]
-            else:
-                attrs[attr] = getattr(self, attr)
+            if isinstance(value, list):
+                value = value[0]
+            attrs[attr] = value
         return attrs
 
     @classmethod
@@ -341,7 +482,8 @@ class LDAPNode(object, metaclass=LDAPNodeBase):
         return cls(*args, **kwargs)
 
     @classmethod
-    def _fetch_entry(cls, primary=None, dnprefix=None, **kwargs):
+    def _fetch_entry(cls, primary=None, dnprefix=None, attrlist=None,
+                     use_cache=True, **kwargs):
         """
         Return a single result entry if unique; else None.
 
@@ -349,7 +491,12 @@ class LDAPNode(object, metaclass=LDAPNodeBase):
         you are trying to do a quick existence check through
         LDAPNode.obj_exists().  Otherwise, this function is used by fetch() to
         retrieve a result and parse it out into a proper object.
+
+        ``attrlist`` defaults to every attribute of the class.  If
+        ``use_cache`` is False, the connection's result cache is bypassed.
         """
+        if attrlist is None:
+            attrlist = cls._attrlist
         if kwargs:
             kwargs = stringify(kwargs)
 
@@ -361,10 +508,11 @@ class LDAPNode(object, metaclass=LDAPNodeBase):
             if isinstance(primary, LDAPNode):
                 primary = primary.dnattr()
 
+        meta = cls._meta
         if dnprefix is None:
             if kwargs:
                 try:
-                    dnprefix = cls._meta.primary_dnprefix % kwargs
+                    dnprefix = meta.compiled_primary_dnprefix(kwargs)
                 except KeyError:
                     # TODO maybe this should throw an exception
                     logging.warning(
@@ -373,15 +521,20 @@ class LDAPNode(object, metaclass=LDAPNodeBase):
                         + ' argument for primary dn prefix.')
                     return None
             else:
-                dnprefix = cls._meta.secondary_dnprefix
-        logging.debug('Fetching %s with dnprefix %s' % (primary, dnprefix))
+                dnprefix = meta.secondary_dnprefix
+        logging.debug('Fetching %s with dnprefix %s', primary, dnprefix)
 
-        conn = getattr(cls, 'connection').get_connection()
-        filter = '(&(%s=%s)%s)' % \
-            (cls._primary_field.ldap, primary, cls.objectclass_filter())
+        conn = cls._get_connection()
+        if cls._fetch_filter_format is not None:
+            filter = cls._fetch_filter_format % escape_filter_value(primary)
+        else:
+            filter = '(&(%s=%s)%s)' % (cls._primary_field.ldap,
+                                       escape_filter_value(primary),
+                                       cls.objectclass_filter())
         basedn = '%s,%s' % (dnprefix, conn.basedn)
         try:
-            result = conn.search(basedn=basedn, filter=filter, attrlist=cls._attrlist)
+            result = conn.search(basedn=basedn, filter=filter, attrlist=attrlist,
+                                 use_cache=use_cache)
         except ldap.NO_SUCH_OBJECT:
             return None
         except ldap.FILTER_ERROR:
@@ -404,7 +557,7 @@ class LDAPNode(object, metaclass=LDAPNodeBase):
             return None
 
     @classmethod
-    def fetch(cls, primary=None, dnprefix=None, **kwargs):
+    def fetch(cls, primary=None, dnprefix=None, use_cache=True, **kwargs):
         """
         Searches the LDAP for a particular object and then will attempt to
         load it into the current object.
@@ -414,15 +567,21 @@ class LDAPNode(object, metaclass=LDAPNodeBase):
                 attribute to be fetched.
             dnprefix -- specify a non-conventional DN prefix.  Otherwise, the
                 default one set on the class is used.
+            use_cache -- if False, read from the server even when the
+                connection has the result cached.
             kwargs -- a hash of the collected attributes that will be used
                      to populate the dnprefix
         """
-        result = cls._fetch_entry(primary=primary, dnprefix=dnprefix, **kwargs)
+        result = cls._fetch_entry(primary=primary, dnprefix=dnprefix,
+                                  use_cache=use_cache, **kwargs)
         if result is not None:
             dn, entry = result
             obj = cls._parse_ldap_entry(dn, entry)
-            logging.debug("Loaded %s %s Successfully" %
-                          (obj.__class__.__name__, obj.dnattr()))
+            # the entry is our own (fresh from the server, or a copy out of
+            # the result cache), so it can be kept without copying it.
+            obj._ldap_snapshot = (dn, entry)
+            logging.debug("Loaded %s %s Successfully",
+                          obj.__class__.__name__, obj.dnattr())
             return obj
         else:
             return None
@@ -441,10 +600,9 @@ class LDAPNode(object, metaclass=LDAPNodeBase):
         """
         if not attrs or len(attrs) == 0:
             return None
-        filter = '(%s' % op
-        for attr in attrs:
-            filter += '(%s=%s)' % (attr, attrs[attr])
-        filter += ')'
+        filter = '(%s%s)' % (op, ''.join([
+            '(%s=%s)' % (attr, escape_filter_value(attrs[attr]))
+            for attr in attrs]))
         objects = cls.list(filter=filter, max_results=1, **kwargs)
         try:
             return objects[0]
@@ -454,15 +612,16 @@ class LDAPNode(object, metaclass=LDAPNodeBase):
     @classmethod
     def fetch_by_dn(cls, dn, **kwargs):
         """Fetch an object when the DN is already known"""
-        dn_parts = dn.split(',', 1)
-        conn = getattr(cls, 'connection').get_connection()
+        conn = cls._get_connection()
         try:
-            rdn_parts = dn_parts[0].split('=', 1)
-            if len(rdn_parts) != 2:
-                return None
-            filter = '(%s=%s)' % tuple(rdn_parts)
-        except IndexError:
+            # the RDN's values come back with their DN escaping undone
+            rdn = str2dn(dn)[0]
+        except (ldap.DECODING_ERROR, IndexError):
             return None
+        filter = ''.join('(%s=%s)' % (attr, escape_filter_value(value))
+                         for attr, value, _ in rdn)
+        if len(rdn) > 1:
+            filter = '(&%s)' % filter
         try:
             dnprefix = middle_dn(dn, ',' + conn.basedn)
         except IndexError:
@@ -476,7 +635,7 @@ class LDAPNode(object, metaclass=LDAPNodeBase):
 
     def refetch(self):
         """Return a fresh copy of the current object pulled from the LDAP"""
-        return self.__class__.fetch(**self.dnattrs())
+        return self.__class__.fetch(use_cache=False, **self.dnattrs())
 
     def _ldap_entry(self):
         """
@@ -488,30 +647,56 @@ class LDAPNode(object, metaclass=LDAPNodeBase):
         attrs = {}
         objectclasses = self.__class__._meta.objectclasses
         attrs['objectclass'] = [o.encode('utf-8') for o in objectclasses]
-        for attr_name, field in self._non_system_fields.items():
-            # ignore attributes starting with a "-"
-            # also ignore fields that are derived (like DNPartField)
-            if attr_name.startswith('-') or field.derived:
-                continue
-
+        for attr_name, ldap_name, sanitize_for_ldap in self._writable_fields:
             val = getattr(self, attr_name)
             if val is not None:
-                sanitized_val = field.sanitize_for_ldap(val)
+                sanitized_val = sanitize_for_ldap(val)
                 if sanitized_val:
-                    attrs[field.ldap] = sanitized_val
+                    attrs[ldap_name] = sanitized_val
         return attrs
 
     @classmethod
     def _parse_ldap_entry(cls, dn, entry):
         """Turn the raw ldap result into a Python object."""
-        kwargs = {}
-        for attr_name, field in cls._fields.items():
-            kwargs[attr_name] = field.populate(dn, entry)
-        return cls(**kwargs)
+        if cls.__init__ is LDAPNode.__init__:
+            obj = cls._construct_from_entry(dn, entry)
+        else:
+            # a subclass with its own __init__ gets to run it
+            kwargs = {}
+            for attr_name, field in cls._fields.items():
+                kwargs[attr_name] = field.populate(dn, entry)
+            obj = cls(**kwargs)
+        return obj
+
+    @classmethod
+    def _construct_from_entry(cls, dn, entry):
+        """
+        Build an object straight from a raw ldap result.
+
+        This does what __init__() would do with every field passed in, but
+        without checking the keyword arguments, which cannot be wrong here.
+        """
+        obj = cls.__new__(cls)
+        obj.logger = ProxyLogger(log)
+        obj.conn = cls._get_connection()
+        obj._basedn = obj.conn.basedn
+        values = {}
+        get = entry.get
+        for attr, ldap_name, populate, coerce_for_python in cls._entry_fields:
+            if ldap_name is None:
+                value = populate(dn, entry)
+            else:
+                value = populate(get(ldap_name))
+            values[attr] = coerce_for_python(value)
+        # none of these are properties, so they can all go in at once
+        obj.__dict__.update(values)
+        return obj
 
     def exists(self):
         """Return True if the current object exists in the LDAP"""
-        return self.conn.exists(self.dn)
+        # callers decide whether to add or modify on this, so it must not
+        # come from the cache
+        return self.conn.exists(self.dn, use_cache=False)
 
     @classmethod
     def obj_exists(cls, *args, **kwargs):
@@ -520,12 +705,14 @@ class LDAPNode(object, metaclass=LDAPNodeBase):
 
         Pass the same arguments you would pass to fetch().
         """
-        return cls._fetch_entry(*args, **kwargs) is not None
+        # the special attribute '1.1' asks the server to return no
+        # attributes at all; only the presence of the entry matters here.
+        return cls._fetch_entry(*args, attrlist=('1.1',), **kwargs) is not None
 
     @classmethod
     def dn_exists(cls, dn):
         """Return True if the DN exists in the LDAP"""
-        return cls.connection.get_connection().exists(dn)
+        return cls._get_connection().exists(dn)
 
     def validate(self):
         """
@@ -539,7 +726,8 @@ class LDAPNode(object, metaclass=LDAPNodeBase):
         """
         return True
 
-    def diff(self, with_ldap_names=False, skip_fake_attrs=False):
+    def diff(self, with_ldap_names=False, skip_fake_attrs=False,
+             snapshot=None):
         """
         Return a hash of values that are different between self and the
         representation of the object in the LDAP.  If the object does not
@@ -548,14 +736,18 @@ class LDAPNode(object, metaclass=LDAPNodeBase):
         The returned hash will map a differing attribute name to a tuple
         containing (value_in_ldap, value_in_object), which is essentially
         (old_value, new_value) if self is to be saved.
+
+        If a ``snapshot`` of the entry, as a (dn, entry) pair, is given and
+        its DN is still the object's DN, it is compared against instead of
+        refetching the object from the LDAP.  The snapshot is not checked
+        for changes made in the LDAP since it was taken.
         """
         results = {}
-        refetch = self.refetch()
-        for attr_name, field in self._non_system_fields.items():
-            # derived fields do not exist as concrete fields on the entry, so
-            # they should never show up in the diff.
-            if field.derived:
-                continue
+        if snapshot is not None and snapshot[0].lower() == self.dn.lower():
+            refetch = self._parse_ldap_entry(*snapshot)
+        else:
+            refetch = self.refetch()
+        for attr_name, ldap_name in self._diff_fields:
             if skip_fake_attrs and attr_name.startswith('-'):
                 continue
 
@@ -573,14 +765,32 @@ class LDAPNode(object, metaclass=LDAPNodeBase):
 
             if self_val != refetch_val:
                 if with_ldap_names:
-                    results[field.ldap] = (refetch_val, self_val)
+                    results[ldap_name] = (refetch_val, self_val)
                 else:
                     results[attr_name] = (refetch_val, self_val)
         return results
 
     def _save_existing(self):
         """Save an existing object."""
-        diff = self.diff(with_ldap_names=False, skip_fake_attrs=True)
+        # an object loaded by fetch() already holds the entry it was loaded
+        # from, which saves another search to diff against it.  This means
+        # the object is diffed against the LDAP as it was at load time: an
+        # attribute changed by someone else since then, and not on this
+        # object, is left alone rather than reverted.
+        snapshot = self._ldap_snapshot
+        diff = self.diff(with_ldap_names=False, skip_fake_attrs=True,
+                         snapshot=snapshot)
+        # Someone else may have set or removed an attribute since the
+        # snapshot was taken, so an add or a delete could now fail.  A
+        # replace works whether or not the attribute is there, and one
+        # without values removes it.
+        add_op = ldap.MOD_ADD if snapshot is None else ldap.MOD_REPLACE
+        delete_op = ldap.MOD_DELETE if snapshot is None else ldap.MOD_REPLACE
+        # every change goes out in one modify request, which the server
+        # applies atomically.  Each entry in `logs` is the pair of
+        # (success, failure) log calls for one modification.
+        mods = []
+        logs = []
         for attr in diff:
             field = self._fields[attr]
             ldap_attr = field.ldap
@@ -589,22 +799,32 @@ class LDAPNode(object, metaclass=LDAPNodeBase):
             if ldap_val and new_val is not None:
                 # modifying existing attribute
                 if old_val:
-                    if self.conn.modify_attr(self.dn, ldap_attr, ldap_val):
-                        self.log__modify_attr_success(attr, old_val, new_val)
-                    else:
-                        self.log__modify_attr_failure(attr, new_val)
+                    mods.append((ldap.MOD_REPLACE, ldap_attr, ldap_val))
+                    logs.append((
+                        partial(self.log__modify_attr_success,
+                                attr, old_val, new_val),
+                        partial(self.log__modify_attr_failure, attr, new_val)))
                 # adding previously nonexistant attribute
                 else:
-                    if self.conn.add_attr(self.dn, ldap_attr, ldap_val):
-                        self.log__add_attr_success(attr, new_val)
-                    else:
-                        self.log__add_attr_failure(attr, new_val)
+                    mods.append((add_op, ldap_attr, ldap_val))
+                    logs.append((
+                        partial(self.log__add_attr_success, attr, new_val),
+                        partial(self.log__add_attr_failure, attr, new_val)))
             # deleting attribute
             else:
-                if self.conn.delete_attr(self.dn, ldap_attr):
-                    self.log__delete_attr_success(attr)
-                else:
-                    self.log__delete_attr_failure(attr)
+                mods.append((delete_op, ldap_attr, None))
+                logs.append((
+                    partial(self.log__delete_attr_success, attr),
+                    partial(self.log__delete_attr_failure, attr)))
+
+        if not mods:
+            return
+        succeeded = self.conn.modify(self.dn, mods)
+        for log_success, log_failure in logs:
+            if succeeded:
+                log_success()
+            else:
+                log_failure()
 
     def _save_new(self):
         """Save a new object."""
@@ -633,10 +853,59 @@ class LDAPNode(object, metaclass=LDAPNodeBase):
             self._save_existing()
         else:
             self._save_new()
+        # the LDAP no longer matches the entry this object was loaded from
+        self._ldap_snapshot = None
+
+    @classmethod
+    def bulk_save(cls, objs):
+        """
+        Save several LDAPNodes, pipelining the adds of the new ones.
+
+        Objects that already exist are saved one at a time as by save().  The
+        new ones are sent together through the connection's add_many(), so
+        that a large import does not wait on the server once per object.
+
+        Return a list holding, in the order of the objects, True, False if
+        the object did not validate, or the exception its save raised.
+        """
+        results = [None] * len(objs)
+        new = []
+        for i, obj in enumerate(objs):
+            if not obj.validate():
+                obj.log__did_not_validate()
+                results[i] = False
+            elif obj.exists():
+                try:
+                    obj._save_existing()
+                    results[i] = True
+                except Exception as e:
+                    results[i] = e
+                obj._ldap_snapshot = None
+            else:
+                obj._before_add_callback()
+                new.append(i)
+
+        # group the adds by connection, which is usually just the one
+        by_conn = {}
+        for i in new:
+            by_conn.setdefault(objs[i].conn, []).append(i)
+        for conn, indices in by_conn.items():
+            entries = [(objs[i].dn, objs[i]._ldap_entry()) for i in indices]
+            for i, result in zip(indices, conn.add_many(entries)):
+                obj = objs[i]
+                obj._ldap_snapshot = None
+                if result is True:
+                    obj._after_add_callback()
+                    obj.log__add_success()
+                else:
+                    obj.log__add_failure()
+                results[i] = result
+        return results
 
     def delete(self):
         """Deletes the current LDAPNode in the LDAP"""
         self._before_delete_callback()
+        self._ldap_snapshot = None
         if self.dn is not None:
             if self.conn.delete(self.dn):
                 self._after_delete_callback()
@@ -684,61 +953,61 @@ class LDAPNode(object, metaclass=LDAPNodeBase):
         if kwargs:
             kwargs = stringify(kwargs)
 
+        meta = cls._meta
         if dnprefix is None:
             if kwargs:
                 try:
-                    dnprefix = cls._meta.primary_dnprefix % kwargs
+                    dnprefix = meta.compiled_primary_dnprefix(kwargs)
                 except KeyError:
-                    dnprefix = cls._meta.secondary_dnprefix
+                    dnprefix = meta.secondary_dnprefix
             else:
-                dnprefix = cls._meta.secondary_dnprefix
+                dnprefix = meta.secondary_dnprefix
 
-        logging.debug('Listing with dnprefix %s' % dnprefix)
+        logging.debug('Listing with dnprefix %s', dnprefix)
         objs = []
 
-        if filter is None:
-            filter = cls.objectclass_filter()
-        else:
-            filter = '(&%s%s)' % (cls.objectclass_filter(), filter)
+        # every clause has to match, so collect them and AND them together
+        clauses = [cls.objectclass_filter()]
+        if filter is not None:
+            clauses.append(filter)
+
+        if prefix or rdn_substring:
+            primary_ldap = cls._primary_field.ldap
 
         if prefix:
-            filter = '(&%s(%s=%s*))' % (filter, cls._primary_field.ldap, prefix)
+            clauses.append('(%s=%s*)' % (primary_ldap,
+                                         escape_filter_value(prefix)))
 
         if rdn_substring:
-            filter = '(&%s(%s=*%s*))' % (filter, cls._primary_field.ldap, rdn_substring)
+            clauses.append('(%s=*%s*)' % (primary_ldap,
+                                          escape_filter_value(rdn_substring)))
 
         if search_prefix:
-            filter = '(&%s%s)' % (
-                filter,
-                cls.searchable_fields_search_prefix_filter(
-                    search_prefix=search_prefix))
+            clauses.append(cls.searchable_fields_search_prefix_filter(
+                search_prefix=search_prefix))
 
         if search_string:
-            filter = '(&%s%s)' % (
-                filter,
-                cls.searchable_fields_search_string_filter(
-                    search_string=search_string))
+            clauses.append(cls.searchable_fields_search_string_filter(
+                search_string=search_string))
 
-        conn = cls.connection.get_connection()
+        if len(clauses) == 1:
+            filter = clauses[0]
+        else:
+            filter = '(&%s)' % ''.join(clauses)
+
+        conn = cls._get_connection()
         basedn = '{},{}'.format(dnprefix, conn.basedn)
         results = conn.search(basedn=basedn, filter=filter, attrlist=cls._attrlist)
         if max_results:
-            num_results_processed = 0
-            for dn, entry in results:
-                if num_results_processed < max_results:
-                    o = cls._parse_ldap_entry(dn, entry)
-                    logging.debug("Loaded %s %s Successfully" %
-                                  (o.__class__.__name__, o.dnattr()))
-                    objs.append(o)
-                    num_results_processed += 1
-                else:
-                    break
-        else:
-            for dn, entry in results:
-                o = cls._parse_ldap_entry(dn, entry)
-                logging.debug("Loaded %s %s Successfully" %
-                              (o.__class__.__name__, o.dnattr()))
-                objs.append(o)
+            results = islice(results, max_results)
+        # only pay for the per-object message when it will be emitted
+        debug = logging.getLogger().isEnabledFor(logging.DEBUG)
+        for dn, entry in results:
+            o = cls._parse_ldap_entry(dn, entry)
+            if debug:
+                logging.debug("Loaded %s %s Successfully",
+                              o.__class__.__name__, o.dnattr())
+            objs.append(o)
         return objs
 
     @classmethod
@@ -758,16 +1027,12 @@ class LDAPNode(object, metaclass=LDAPNodeBase):
         if not attrs:
             return []
 
-        filter = '(%s' % op
-        if isinstance(attrs, list):
-            for k, v in attrs:
-                filter += '(%s=%s)' % (k, v)
-        elif isinstance(attrs, dict):
-            for k, v in attrs.items():
-                filter += '(%s=%s)' % (k, v)
-        else:
+        if isinstance(attrs, dict):
+            attrs = attrs.items()
+        elif not isinstance(attrs, list):
             raise ValueError('attrs must be of type list or dict')
-        filter += ')'
+        filter = '(%s%s)' % (op, ''.join([
+            '(%s=%s)' % (k, escape_filter_value(v)) for k, v in attrs]))
 
         return cls.list(filter=filter, **kwargs)
 
@@ -811,49 +1076,62 @@ class LDAPNode(object, metaclass=LDAPNodeBase):
         return cls._list_by(op='&', attrs=attrs, **kwargs)
 
     @classmethod
-    def _searchable_fields_filter(cls, search_term, template,
+    def _searchable_fields_filter(cls, search_term, templates,
                                   searchable_fields=None):
         """
         A helper method for searchable fields
 
-        template must have two value placeholders for the var and the value
+        Return an OR of every template filled in for every searchable field.
+        Each of the templates must have two value placeholders for the var
+        and the value.
         """
-        filter = ''
+        search_term = escape_filter_value(search_term)
 
         if searchable_fields is None:
             searchable_fields = cls._meta.searchable_fields
         # TODO searchable_fields, if passed in, will need to be converted from
         # Python names to LDAP names
 
-        for field in searchable_fields:
-            filter += template % (field, search_term)
-
-        return '(|%s)' % filter
+        return '(|%s)' % ''.join([template % (field, search_term)
+                                  for template in templates
+                                  for field in searchable_fields])
 
     @classmethod
     def searchable_fields_search_prefix_filter(cls, search_prefix,
                                                searchable_fields=None):
         """Return a search prefix filter using the searchable_fields"""
         return cls._searchable_fields_filter(
-            search_term=search_prefix, template='(%s=%s*)',
+            search_term=search_prefix, templates=('(%s=%s*)',),
             searchable_fields=searchable_fields)
 
     @classmethod
     def searchable_fields_search_string_filter(cls, search_string,
                                                searchable_fields=None):
         """Return a search substring filter using the searchable_fields"""
-        templates = ['(%s=%s)', '(%s=%s*)', '(%s=*%s)', '(%s=*%s*)']
-        filter = ''
-        for template in templates:
-            filter = filter + cls._searchable_fields_filter(
-                search_term=search_string, template=template,
-                searchable_fields=searchable_fields)
-        return '(|%s)' % filter
+        # '*x*' also matches the values that are 'x', start with it or end
+        # with it.  The equality match stays for attributes that have no
+        # substring matching rule.
+        templates = ('(%s=%s)', '(%s=*%s*)')
+        return cls._searchable_fields_filter(
+            search_term=search_string, templates=templates,
+            searchable_fields=searchable_fields)
 
     def has_attrval(self, var, value):
         """Return True if the var has the value in question; False otherwise"""
         return value in getattr(self, var)
 
+    def present_attrvals(self, var, values):
+        """
+        Return the list of ``values`` that the var has, in the order given.
+
+        This is has_attrval() for many values at once.  The var's values are
+        put in a set first, so each check does not scan the whole list.
+        Values are not cached between calls, since the lists of an object
+        can be changed in place.
+        """
+        have = set(getattr(self, var) or ())
+        return [value for value in values if value in have]
+
     def _obscure_if_sensitive(self, attr_name, value):
         """
         Return "*****" if the attribute is sensitive.  If the attribute is
@@ -918,6 +1196,9 @@ class LDAPNode(object, metaclass=LDAPNodeBase):
     def log__modify_attr_success(self, attr_name, old_val, new_val):
         """Log a successful modification of a field on the current LDAPNode"""
         if isinstance(old_val, list) and isinstance(new_val, list):
+            # nothing was added or removed, so skip building the sets
+            if old_val == new_val:
+                return
             old_val = set(old_val)
             new_val = set(new_val)
             added = list(new_val - old_val)
@@ -976,7 +1257,19 @@ class LDAPNode(object, metaclass=LDAPNodeBase):
 
     @classmethod
     def objectclass_filter(cls):
-        """Return a string LDAP filter from the objectClass attributes"""
+        """
+        Return a string LDAP filter from the objectClass attributes
+
+        The filter is built once, when the class is created.  It stays a
+        str: python-ldap only accepts str filters on Python 3, and it is
+        usually combined into a larger filter before it is sent anyway.
+        """
+        if cls._objectclass_filter is not None:
+            return cls._objectclass_filter
+        return cls._build_objectclass_filter()
+
+    @classmethod
+    def _build_objectclass_filter(cls):
         f = build_ldap_filter(
             op='&', attrname='objectClass', items=cls._meta.objectclasses)
         if cls._meta.excluded_objectclasses:
@@ -996,7 +1289,7 @@ class LDAPNode(object, metaclass=LDAPNodeBase):
         """
         diff = self.diff()
 
-        if attr not in self._fields.keys():
+        if attr not in self._fields:
             raise ArgumentError("%s is not a valid attribute" % attr)
 
         if attr not in diff:
@@ -1032,12 +1325,10 @@ class LDAPNode(object, metaclass=LDAPNodeBase):
         return self.attr_difference_since_last_save(attr).get('removed', [])
 
     def _check_required_fields_present(self, attrs):
-        necessary = set([f for f, val in self._fields.items() if not val.optional])
-        available = set(attrs)
-        missing = necessary - available
+        missing = self._required_field_names.difference(attrs)
         if missing:
             if len(missing) == 1:
-                msg = "Required field '{}' is missing".format(missing.pop())
+                msg = "Required field '{}' is missing".format(next(iter(missing)))
             else:
                 fields = ["'{}'".format(f) for f in missing]
                 msg = 'Required fields [{}] are missing'.format(', '.join(fields))
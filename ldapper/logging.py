@@ -1,3 +1,9 @@
+from array import array
+
+# the levels that ProxyLogger stores with each message, and their names
+DEBUG, INFO, WARNING, ERROR = range(4)
+LEVEL_NAMES = ('DEBUG', 'INFO', 'WARNING', 'ERROR')
+
 
 class ProxyLogger(object):
     """
@@ -10,36 +16,52 @@ class ProxyLogger(object):
     """
 
     def __init__(self, logger):
-        self._messages = []
+        # the messages and their levels are kept in parallel, the levels in
+        # a compact array of small ints, rather than as one tuple apiece.
+        self._levels = array('b')
+        self._msgs = []
+        self._warning_count = 0
+        self._error_count = 0
         self.logger = logger
 
     def get_messages(self):
-        return self._messages
+        """Return a list of the (level name, message) pairs stored so far."""
+        return [(LEVEL_NAMES[level], msg)
+                for level, msg in zip(self._levels, self._msgs)]
 
     def flush(self):
         """Clear all messages and return them afterwards."""
-        messages = self._messages
-        self._messages = []
+        messages = self.get_messages()
+        self._levels = array('b')
+        self._msgs = []
+        self._warning_count = 0
+        self._error_count = 0
         return messages
 
+    def _store(self, level, msg):
+        self._levels.append(level)
+        self._msgs.append(msg)
+
     def warning(self, msg):
-        self._messages.append(("WARNING", msg))
+        self._store(WARNING, msg)
+        self._warning_count += 1
         self.logger.warning(msg)
 
     def info(self, msg):
-        self._messages.append(("INFO", msg))
+        self._store(INFO, msg)
         self.logger.info(msg)
 
     def error(self, msg):
-        self._messages.append(("ERROR", msg))
+        self._store(ERROR, msg)
+        self._error_count += 1
         self.logger.error(msg)
 
     def debug(self, msg):
-        self._messages.append(("DEBUG", msg))
+        self._store(DEBUG, msg)
         self.logger.debug(msg)
 
     def has_errors(self):
-        return any(et == 'ERROR' for et, _ in self._messages)
+        return self._error_count > 0
 
     def has_warnings(self):
-        return any(et == 'WARNING' for et, _ in self._messages)
+        return self._warning_count > 0
@@ -0,0 +1,205 @@
+import time
+import queue
+import logging
+import threading
+from contextlib import contextmanager
+
+import ldap
+
+log = logging.getLogger(__name__)
+
+# how long, in seconds, a checkout waits on a full pool between looks
+_WAIT_INTERVAL = 0.1
+
+
+class ConnectionPool(object):
+    """
+    A bounded pool of LDAP handles that are all bound as the same identity.
+
+    Handles are created lazily, up to ``max_size``, as concurrent callers
+    check them out.  A handle that fails with ``ldap.SERVER_DOWN`` is thrown
+    away along with every idle handle, since they have most likely all gone
+    stale together; fresh ones are bound on the next checkout.
+
+    Servers and firewalls drop connections that sit idle.  A handle that
+    has been idle for more than ``idle_timeout`` seconds is checked with a
+    cheap whoami before it is lent out, and replaced if that fails.  Pass
+    None to never check.
+
+    Once ``close()`` has been called the pool lends out nothing more, and
+    handles that were checked out at the time are unbound as they come back.
+    """
+
+    def __init__(self, uri, logindn=None, password=None, max_size=4,
+                 idle_timeout=300):
+        self.uri = uri
+        self.logindn = logindn
+        self.password = password
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        # holds (time last returned, handle) pairs
+        self._idle = queue.LifoQueue(maxsize=max_size)
+        self._size = 0
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def _new_handle(self):
+        handle = ldap.initialize(self.uri)
+        handle.set_option(ldap.OPT_PROTOCOL_VERSION, 3)
+        try:
+            self._bind(handle)
+        except ldap.LDAPError:
+            handle.unbind_s()
+            raise
+        return handle
+
+    def _bind(self, handle):
+        if self.logindn is None and self.password is None:
+            handle.simple_bind_s()
+        else:
+            handle.simple_bind_s(self.logindn, self.password)
+
+    def fill(self, size):
+        """
+        Create and bind handles until the pool holds ``size`` of them.
+
+        Raises the underlying ``ldap.LDAPError`` if a handle cannot be bound.
+        """
+        while True:
+            with self._lock:
+                if self._size >= min(size, self.max_size):
+                    return
+                self._size += 1
+            try:
+                handle = self._new_handle()
+            except Exception:
+                with self._lock:
+                    self._size -= 1
+                raise
+            self._release(handle)
+
+    def _acquire(self):
+        while True:
+            if self._closed:
+                raise ValueError('connection pool for %s is closed' % self.uri)
+            try:
+                return self._check_idle(*self._idle.get_nowait())
+            except queue.Empty:
+                pass
+            with self._lock:
+                create = self._size < self.max_size
+                if create:
+                    self._size += 1
+            if create:
+                break
+            # A handle that is discarded, or a pool that is closed, frees
+            # up room without putting anything in the queue, so look again
+            # every so often rather than waiting on it for good.
+            try:
+                return self._check_idle(*self._idle.get(timeout=_WAIT_INTERVAL))
+            except queue.Empty:
+                pass
+        try:
+            return self._new_handle()
+        except Exception:
+            with self._lock:
+                self._size -= 1
+            raise
+
+    def _check_idle(self, last_used, handle):
+        """Return ``handle``, or a fresh one if it has gone stale."""
+        if self.idle_timeout is None or \
+                time.monotonic() - last_used <= self.idle_timeout:
+            return handle
+        try:
+            handle.whoami_s()
+            return handle
+        except ldap.LDAPError:
+            log.info('Replacing idle connection to %s', self.uri)
+        # the replacement takes over the stale handle's place in the pool
+        try:
+            handle.unbind_s()
+        except ldap.LDAPError:
+            pass
+        try:
+            return self._new_handle()
+        except Exception:
+            with self._lock:
+                self._size -= 1
+            raise
+
+    def _release(self, handle):
+        if self._closed:
+            self._discard(handle)
+            return
+        self._idle.put((time.monotonic(), handle))
+        # close() may have drained the queue just before the put above
+        if self._closed:
+            self.clear()
+
+    def _discard(self, handle):
+        with self._lock:
+            self._size -= 1
+        try:
+            handle.unbind_s()
+        except ldap.LDAPError:
+            pass
+
+    @contextmanager
+    def checkout(self):
+        """Lend out a bound handle for the duration of a ``with`` block."""
+        handle = self._acquire()
+        try:
+            yield handle
+        except ldap.SERVER_DOWN:
+            log.warning('Discarding stale connections to %s', self.uri)
+            self._discard(handle)
+            self.clear()
+            raise
+        except BaseException:
+            self._release(handle)
+            raise
+        else:
+            self._release(handle)
+
+    def bind_and_revert(self, dn, password):
+        """
+        Return True if ``dn`` can bind with ``password``; False otherwise.
+
+        The check is made on a pooled handle, which is bound back to the
+        pool's own identity before being returned to the pool.
+        """
+        # an empty password would make this an unauthenticated bind, which
+        # the server allows for any dn.
+        if not password:
+            return False
+        handle = self._acquire()
+        try:
+            try:
+                handle.simple_bind_s(dn, password)
+                valid = True
+            except ldap.LDAPError:
+                valid = False
+            finally:
+                self._bind(handle)
+        except BaseException:
+            # the handle may still be bound as ``dn``, so it must never go
+            # back into the pool
+            self._discard(handle)
+            raise
+        self._release(handle)
+        return valid
+
+    def close(self):
+        """Unbind every handle and refuse to lend out any more."""
+        self._closed = True
+        self.clear()
+
+    def clear(self):
+        """Unbind and drop every idle handle."""
+        while True:
+            try:
+                _, handle = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(handle)
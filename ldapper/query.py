@@ -1,3 +1,6 @@
+from operator import itemgetter
+
+
 class Q(object):
     """
     Query class used to build arbitrarily complex query filters.
@@ -11,22 +14,40 @@ class Q(object):
     """
 
     def __init__(self, **conditions):
-        self.conditions = conditions.items()
+        # sorted, so that the same conditions given in any order compile to
+        # the same filter, and so share the connection's search cache
+        self.conditions = tuple(sorted(conditions.items(), key=itemgetter(0)))
+        # compiled filters by LDAPNode class.  The conditions of a Q never
+        # change, so neither does its filter.  And and Or are not cached,
+        # since combining queries can add to their ops after the fact.
+        self._compiled = {}
 
     def compile(self, cls):
-        immediate_filter = ''
+        try:
+            return self._compiled[cls]
+        except KeyError:
+            pass
+
+        parts = []
         for cond_k, cond_v in self.conditions:
             try:
-                attrname = cls._fields.get(cond_k).ldap
-            except AttributeError:
+                attrname = cls._field_ldap_names[cond_k]
+            except KeyError:
                 raise AttributeError(
                     f'{cond_k} is not a valid field on {cls.__name__}: '
                     f'Expected: {list(cls._fields.keys())}')
-            immediate_filter += f'({attrname}={cond_v})'
-
-        if len(self.conditions) > 1:
-            immediate_filter = f'(&{immediate_filter})'
+            parts.append(f'({attrname}={cond_v})')
+
+        # a single condition, by far the most common Q, needs no join or
+        # wrapping
+        if len(parts) == 1:
+            immediate_filter = parts[0]
+        elif parts:
+            immediate_filter = f"(&{''.join(parts)})"
+        else:
+            immediate_filter = ''
 
+        self._compiled[cls] = immediate_filter
         return immediate_filter
 
     def check_type_compat(self, other):
@@ -50,16 +71,28 @@ class Q(object):
             return And([self, other])
 
 
-class And(Q):
+class Combination(Q):
+    """
+    A list of queries joined by one operator, which subclasses set as
+    ``op``.
+    """
+
+    op = None
 
     def __init__(self, ops):
         self.ops = ops
 
     def compile(self, cls):
-        f = ''
-        for op in self.ops:
-            f += op.compile(cls)
-        return f'(&{f})'
+        # Not cached: combining queries changes ops in place, possibly in a
+        # combination nested under this one.  The leaves are cached, so this
+        # is only the join.
+        f = ''.join([op.compile(cls) for op in self.ops])
+        return f'({self.op}{f})'
+
+
+class And(Combination):
+
+    op = '&'
 
     def __and__(self, other):
         if type(other) is Q:  # And(...) & Q(...)
@@ -78,16 +111,9 @@ class And(Q):
             return super().__and__(other)
 
 
-class Or(Q):
+class Or(Combination):
 
-    def __init__(self, ops):
-        self.ops = ops
-
-    def compile(self, cls):
-        f = ''
-        for op in self.ops:
-            f += op.compile(cls)
-        return f'(|{f})'
+    op = '|'
 
     def __or__(self, other):
         if type(other) is Q:
@@ -1,4 +1,6 @@
 import re
+from functools import lru_cache
+from itertools import islice
 import ldap
 import datetime as dt
 
@@ -8,22 +10,110 @@ from ldapper.exceptions import InvalidDN
 
 WIN32_EPOCH = dt.datetime(1601, 1, 1)
 
+FORMAT_KEY = re.compile(r'%\((\w+)\)s')
+
+# strip_dn_path() can skip the regex engine for strings without these
+REGEX_META = re.compile(r'[.^$*+?{}\[\]\\|()]')
+
+# RFC 4515 escapes for the characters that are special in a filter value
+FILTER_ESCAPES = str.maketrans({
+    '\\': r'\5c',
+    '*': r'\2a',
+    '(': r'\28',
+    ')': r'\29',
+    '\x00': r'\00',
+})
+
 
 def ad_date_parse(ts):
     """Parse an ActiveDirectory timestamp and return a datetime object"""
     return WIN32_EPOCH + dt.timedelta(seconds=(int(ts) / 10000000))
 
 
+def generalized_time_parse(ts):
+    """
+    Parse an LDAP GeneralizedTime such as createTimestamp, in the
+    YYYYMMDDHHMMSSZ form that servers return, into a naive datetime.
+    """
+    # slicing the fixed-width form is several times faster than strptime,
+    # which is left to report anything malformed.
+    if len(ts) == 15 and ts[14] == 'Z' and ts[:14].isdigit():
+        return dt.datetime(int(ts[0:4]), int(ts[4:6]), int(ts[6:8]),
+                           int(ts[8:10]), int(ts[10:12]), int(ts[12:14]))
+    return dt.datetime.strptime(ts, '%Y%m%d%H%M%SZ')
+
+
 def bolded(val):
     """return a bolded version of the string passed in"""
     return '%s%s%s' % ('\033[1m', val, '\033[0m')
 
 
+def chunks_of(items, size):
+    """Yield successive lists of at most ``size`` items from ``items``."""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def parse_format(fmt):
+    """
+    Split a format string with ``%(name)s`` placeholders, such as a
+    Meta.dn_format, into a ``str.format`` template with positional ``{}``
+    fields and the tuple of placeholder names that fill them, in order.
+
+    Return None if ``fmt`` uses any other kind of %-conversion.
+    """
+    parts = FORMAT_KEY.split(fmt)
+    # parts alternates between literal text and placeholder names
+    literals, keys = parts[0::2], parts[1::2]
+    if any('%' in literal for literal in literals):
+        return None
+    template = '{}'.join(
+        literal.replace('{', '{{').replace('}', '}}') for literal in literals)
+    return template, tuple(keys)
+
+
+def compile_format(fmt):
+    """
+    Return a function that does the same as ``fmt % mapping`` for a format
+    string with ``%(name)s`` placeholders, such as a Meta.dn_format.
+
+    The format string is parsed once, here, rather than on every call.
+    Format strings with any other kind of conversion fall back to plain
+    %-formatting.  Return None if ``fmt`` is None.
+    """
+    if fmt is None:
+        return None
+    parsed = parse_format(fmt)
+    if parsed is None:
+        return lambda mapping: fmt % mapping
+    template, keys = parsed
+    if not keys:
+        return lambda mapping: fmt
+    if len(keys) == 1:
+        prefix, suffix = FORMAT_KEY.split(fmt)[0::2]
+        key = keys[0]
+        return lambda mapping: prefix + str(mapping[key]) + suffix
+    return lambda mapping: template.format(*[mapping[k] for k in keys])
+
+
 def dn_attribute(dn, attr):
     """Given a full DN return the value of the attribute given"""
-    for rdn in dn.split(','):
-        if rdn.startswith('%s=' % attr):
-            return rdn.split('=', 1)[1]
+    prefix = attr + '='
+    # find the first RDN for attr in place, rather than splitting every RDN
+    if dn.startswith(prefix):
+        start = len(prefix)
+    else:
+        start = dn.find(',' + prefix)
+        if start < 0:
+            return None
+        start += len(prefix) + 1
+    end = dn.find(',', start)
+    return dn[start:] if end < 0 else dn[start:end]
+
+
+@lru_cache(maxsize=256)
+def _strip_pattern(pattern):
+    return re.compile(pattern, re.IGNORECASE)
 
 
 def strip_dn_path(dn, left=None, right=None):
@@ -31,23 +121,34 @@ def strip_dn_path(dn, left=None, right=None):
        This is case insenstive"""
     dn_path = dn
     if right is not None:
-        rpattern = re.compile(right + '$', re.IGNORECASE)
-        dn_path = rpattern.sub('', dn_path)
+        if REGEX_META.search(right):
+            dn_path = _strip_pattern(right + '$').sub('', dn_path)
+        elif right and dn_path.lower().endswith(right.lower()):
+            dn_path = dn_path[:-len(right)]
     if left is not None:
-        lpattern = re.compile('^' + left, re.IGNORECASE)
-        dn_path = lpattern.sub('', dn_path)
+        if REGEX_META.search(left):
+            dn_path = _strip_pattern('^' + left).sub('', dn_path)
+        elif dn_path.lower().startswith(left.lower()):
+            dn_path = dn_path[len(left):]
     return dn_path
 
 
 def middle_dn(dn, right):
     """Strip the first DN component and the right and return what's left."""
-    try:
-        first, rest = dn.split(',', 1)
-    except ValueError:
+    _, sep, rest = dn.partition(',')
+    if not sep:
         return None
     return strip_dn_path(rest, right=right)
 
 
+def escape_filter_value(value):
+    """
+    Return ``value`` as a string that matches itself literally when used as
+    the value in an LDAP search filter.
+    """
+    return str(value).translate(FILTER_ESCAPES)
+
+
 def get_attr(entry, attr):
     """
     Return the first value for an attribute in the given entry.
@@ -79,7 +180,14 @@ def inflect_given_cardinality(word, num_items):
     Return the singular form of the word if `num_items` is 1.  Otherwise,
     return the plural form of the word.
     """
-    if num_items == 1:
+    return _inflect(word, num_items == 1)
+
+
+# the attribute names that get inflected are few, and the inflection rules
+# are a long list of regexes, so remember the results.
+@lru_cache(maxsize=256)
+def _inflect(word, singular):
+    if singular:
         return singularize(word)
     else:
         return pluralize(word)
@@ -126,8 +234,11 @@ def build_ldap_filter(op='&', attrname='objectClass', items=None):
     """
     if not items:
         raise ValueError("items list must exist")
-    inside = ''.join(['(%s=%s)' % (attrname, item) for item in items])
-    return '(%s%s)' % (op, inside)
+    # one join, with the separator between items carrying the attribute
+    # name, so that no item needs a format operation of its own
+    separator = ')(%s=' % attrname
+    inside = separator.join(map(str, items))
+    return '(%s(%s=%s))' % (op, attrname, inside)
 
 
 def list_items_to_sentence(items):
@@ -136,29 +247,32 @@ def list_items_to_sentence(items):
     commas and the last element separated by "and" if there are more than
     two items.
     """
-    if len(items) == 1:
+    num_items = len(items)
+    if num_items == 1:
         return str(items[0])
-    elif len(items) == 2:
+    elif num_items == 2:
         return '%s and %s' % (items[0], items[1])
-    elif len(items) > 1:
-        return '%s, and %s' % (', '.join(map(str, items[:-1])), items[-1])
+    elif num_items > 1:
+        return '%s, and %s' % (
+            ', '.join(map(str, islice(items, num_items - 1))), items[-1])
 
 
 def print_word_list(words, line_length=79):
     """Given a list, print it in a condensed form separated by spaces"""
     chars_left_in_line = line_length
-    returning = ''
+    returning = []
 
     for word in words:
         if not isinstance(word, str):
             word = str(word)
         if chars_left_in_line < len(word) + 1:
-            returning += '\n'
+            returning.append('\n')
             chars_left_in_line = line_length
-        returning += ' %s' % (word)
+        returning.append(' ')
+        returning.append(word)
         chars_left_in_line -= (len(word) + 1)
 
-    return returning
+    return ''.join(returning)
 
 
 def remove_empty_strings(val):
@@ -171,7 +285,7 @@ def remove_empty_strings(val):
     should also not be considered different.
     """
     if type(val) is list:
-        return [x for x in val if x]
+        return list(filter(None, val))
     elif isinstance(val, str):
         if len(val) == 0:
             return None
@@ -186,13 +300,15 @@ def stringify(args):
     Given a hash, turn values that are LDAPNode objects into string
     representations based off the primary dn attribute.
     """
+    # the common case is that every value is already a plain string
+    if all(type(v) is str for v in args.values()):
+        return dict(args)
     returning = {}
-    for attr in args:
-        primary = getattr(args[attr], 'primary', None)
+    for attr, value in args.items():
+        primary = getattr(value, 'primary', None)
         if primary:
-            returning[attr] = getattr(args[attr], primary)
-        else:
-            returning[attr] = args[attr]
+            value = getattr(value, primary)
+        returning[attr] = value
     return returning
 
 
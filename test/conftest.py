@@ -11,3 +11,17 @@ def connection():
     conn = Connection.connect(logindn=logindn, password=password)
     Connection.set_connection(conn)
     return conn
+
+
+@pytest.fixture
+def result_cache(monkeypatch):
+    """Turn on the connection's result cache, which is off by default."""
+    monkeypatch.setattr(Connection, 'cache_ttl', 3600)
+    monkeypatch.setattr(Connection, 'negative_cache_ttl', 60)
+
+
+@pytest.fixture(autouse=True)
+def flush_cache():
+    # results are cached for the life of a test, and not from one to the next
+    yield
+    Connection.flush_cache()
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+from ldapper.cache import ResultCache
+
+
+class TestResultCache:
+
+    def test_cache_get_set(self):
+        cache = ResultCache()
+        key = ('dc=acme,dc=org', 'exists')
+        assert cache.get(key) is None
+        assert cache.get(key, 'default') == 'default'
+
+        cache.set(key, True, ttl=60)
+        assert cache.get(key) is True
+        assert key in cache
+        assert len(cache) == 1
+
+    def test_cache_expiry(self):
+        cache = ResultCache()
+        key = ('dc=acme,dc=org', 'exists')
+        cache.set(key, True, ttl=0)
+        assert cache.get(key) is None
+        assert len(cache) == 0
+
+    def test_cache_lru_eviction(self):
+        cache = ResultCache(maxsize=2)
+        cache.set(('cn=a',), 'a', ttl=60)
+        cache.set(('cn=b',), 'b', ttl=60)
+        # touching 'a' makes 'b' the least recently used entry
+        assert cache.get(('cn=a',)) == 'a'
+        cache.set(('cn=c',), 'c', ttl=60)
+        assert cache.get(('cn=b',)) is None
+        assert cache.get(('cn=a',)) == 'a'
+        assert cache.get(('cn=c',)) == 'c'
+
+    def test_cache_invalidate(self):
+        cache = ResultCache()
+        cache.set(('dc=acme,dc=org', 'subtree'), 'root', ttl=60)
+        cache.set(('ou=people,dc=acme,dc=org', 'subtree'), 'people', ttl=60)
+        cache.set(('uid=liam,ou=people,dc=acme,dc=org', 'exists'), True, ttl=60)
+        cache.set(('ou=groups,dc=acme,dc=org', 'subtree'), 'groups', ttl=60)
+
+        cache.invalidate('UID=liam,ou=people,dc=acme,dc=org')
+        assert cache.get(('dc=acme,dc=org', 'subtree')) is None
+        assert cache.get(('ou=people,dc=acme,dc=org', 'subtree')) is None
+        assert cache.get(('uid=liam,ou=people,dc=acme,dc=org', 'exists')) is None
+        assert cache.get(('ou=groups,dc=acme,dc=org', 'subtree')) == 'groups'
+
+    def test_cache_clear(self):
+        cache = ResultCache()
+        cache.set(('cn=a',), 'a', ttl=60)
+        cache.clear()
+        assert len(cache) == 0
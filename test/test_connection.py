@@ -1,8 +1,11 @@
 # -*- coding: utf-8 -*-
 
 import ldap
+import ldap.modlist
 import pytest
 
+from ldapper.exceptions import AddDNFailed, NoSuchAttrValue
+
 from .utils import Connection
 from .test_ldapnode import get_person
 
@@ -42,6 +45,10 @@ class TestConnection:
         # an already fully qualified dn is left unchanged
         assert conn._fully_qualify_dn(logindn=dn) == dn
 
+        # special characters in a shortname are escaped
+        assert conn._fully_qualify_dn(logindn='a+b') == \
+            'uid=a\\+b,ou=people,dc=acme,dc=org'
+
     def test_connection_str(self, connection):
         expected = 'ldap://localhost:389 as cn=admin,dc=acme,dc=org'
         assert str(connection) == expected
@@ -79,3 +86,162 @@ class TestConnection:
 
         p1.delete()
         p2.delete()
+
+    def test_connection_search_cache(self, connection, result_cache):
+        p = get_person()
+        p.uid = 'carol'
+        dn = 'uid=carol,ou=people,dc=acme,dc=org'
+        assert connection.exists(dn) is False
+
+        # writes invalidate the cached negative result
+        p.save()
+        assert connection.exists(dn) is True
+
+        results = connection.search(filter='(uid=carol)')
+        assert len(results) == 1
+        # callers get their own copy of a cached result
+        results.pop()
+        assert len(connection.search(filter='(uid=carol)')) == 1
+
+        p.delete()
+        assert connection.exists(dn) is False
+        assert connection.search(filter='(uid=carol)') == []
+
+        # a change made behind the cache is only seen when it is bypassed
+        assert connection.exists(dn) is False
+        with connection._pool.checkout() as ldaps:
+            ldaps.add_s(dn, ldap.modlist.addModlist(p._ldap_entry()))
+        assert connection.exists(dn) is False
+        assert connection.exists(dn, use_cache=False) is True
+        assert len(connection.search(filter='(uid=carol)', use_cache=False)) == 1
+        p.delete()
+
+        connection.flush_cache()
+
+    def test_connection_authenticate(self):
+        conn = Connection.connect_anon()
+        assert conn.authenticate('cn=admin,dc=acme,dc=org', 'JonSn0w')
+        assert not conn.authenticate('cn=admin,dc=acme,dc=org', 'wrong')
+        assert conn.is_anonymous()
+
+    def test_connection_search_many(self, connection):
+        people = []
+        for uid in ('dave', 'erin', 'frank'):
+            p = get_person()
+            p.uid = uid
+            p.save()
+            people.append(p)
+
+        found = connection.search_many(
+            'uid', ['dave', 'ERIN', 'frank', 'nobody', 'x*)(uid=*'],
+            chunk_size=2, page_size=1)
+        assert sorted(found.keys()) == ['ERIN', 'dave', 'frank']
+        dn, entry = found['dave']
+        assert dn == 'uid=dave,ou=people,dc=acme,dc=org'
+        assert entry['uid'] == [b'dave']
+
+        # the attribute name is matched case-insensitively too
+        found = connection.search_many('UID', ['dave'])
+        assert list(found) == ['dave']
+
+        for p in people:
+            p.delete()
+
+    def test_connection_asearch(self, connection):
+        results = connection.asearch([
+            ('dc=acme,dc=org', ldap.SCOPE_BASE),
+            ('cn=admin,dc=acme,dc=org', ldap.SCOPE_BASE, '(objectClass=*)'),
+            ('cn=nobody,dc=acme,dc=org', ldap.SCOPE_BASE),
+        ])
+        assert len(results) == 3
+        assert results[0][0][0] == 'dc=acme,dc=org'
+        assert results[1][0][0] == 'cn=admin,dc=acme,dc=org'
+        assert isinstance(results[2], ldap.NO_SUCH_OBJECT)
+
+    def test_connection_add_many(self, connection):
+        people = []
+        for uid in ('gina', 'hank'):
+            p = get_person()
+            p.uid = uid
+            people.append(p)
+        entries = [(p.dn, p._ldap_entry()) for p in people]
+        entries.append(('uid=x,ou=nowhere,dc=acme,dc=org', entries[0][1]))
+
+        results = connection.add_many(entries)
+        assert results[:2] == [True, True]
+        assert isinstance(results[2], AddDNFailed)
+        assert all(p.exists() for p in people)
+
+        for p in people:
+            p.delete()
+
+    def test_connection_modify(self, connection):
+        p = get_person()
+        p.save()
+
+        assert connection.modify(p.dn, [
+            (ldap.MOD_REPLACE, 'sn', [b'Jones']),
+            (ldap.MOD_ADD, 'mailLocalAddress', [b'liam@acme.org']),
+        ])
+        fetched = p.refetch()
+        assert fetched.lastname == 'Jones'
+        assert fetched.addresses == ['liam@acme.org']
+
+        # the modifications are applied all or nothing
+        with pytest.raises(NoSuchAttrValue) as e:
+            connection.modify(p.dn, [
+                (ldap.MOD_REPLACE, 'sn', [b'Smith']),
+                (ldap.MOD_DELETE, 'mailLocalAddress', [b'nobody@acme.org']),
+            ])
+        assert e.value.attribute == 'mailLocalAddress'
+        assert p.refetch().lastname == 'Jones'
+
+        p.delete()
+
+    def test_connection_close(self):
+        with Connection.connect_anon() as conn:
+            assert conn._pool._size == 1
+        assert conn._pool._size == 0
+        # closing twice is harmless
+        conn.close()
+
+    def test_connection_use_after_close(self):
+        conn = Connection.connect_anon()
+        with conn._pool.checkout():
+            conn.close()
+        # the handle that was checked out is unbound on its way back
+        assert conn._pool._size == 0
+        with pytest.raises(ValueError):
+            conn.exists('dc=acme,dc=org')
+        assert conn._pool._size == 0
+
+    def test_connection_lazy(self):
+        Connection.flush_cache()
+        conn = Connection(logindn='cn=admin,dc=acme,dc=org',
+                          password='JonSn0w', lazy=True)
+        assert conn._pool._size == 0
+        assert conn.whoami() == 'cn=admin,dc=acme,dc=org'
+        assert conn._pool._size == 0
+
+        assert conn.exists('cn=admin,dc=acme,dc=org')
+        assert conn._pool._size == 1
+
+        # a username@domain login only asks who it is once that is needed
+        conn = Connection(logindn='admin@acme.org', password='JonSn0w',
+                          lazy=True)
+        assert conn._pool._size == 0
+
+        # bad credentials are only noticed once the connection is used
+        conn = Connection(logindn='cn=admin,dc=acme,dc=org',
+                          password='wrong', lazy=True)
+        with pytest.raises(ldap.INVALID_CREDENTIALS):
+            conn.search()
+
+    def test_connection_lazy_cache_hit_does_not_bind(self, result_cache):
+        conn = Connection(logindn='admin@acme.org', password='JonSn0w',
+                          lazy=True)
+        dn = 'cn=admin,dc=acme,dc=org'
+        conn._cache_set((dn, 'exists', conn.uri, 'admin@acme.org'), True)
+        # answered from the cache without asking the server who we are
+        assert conn.exists(dn)
+        assert conn._pool._size == 0
@@ -4,6 +4,8 @@ from ldapper.exceptions import (
     AddDNFailed,
     ArgumentError,
     DuplicateValue,
+    InvalidDN,
+    LdapperError,
     NoSuchAttrValue,
     NoSuchDN,
 )
@@ -25,6 +27,13 @@ class TestExceptions:
         error = DuplicateValue(attr='foods', value=lst)
         assert error.offending_values == ['wine']
         assert error.msg == 'Attribute "foods" has duplicate value(s): [\'wine\']'
+        # the message is formatted once and then reused
+        assert error.msg is error.msg
+
+        # each duplicate is reported once, in the order it first appears
+        lst = ['wine', 'bread', 'cheese', 'bread', 'wine', 'wine']
+        error = DuplicateValue(attr='foods', value=lst)
+        assert error.offending_values == ['wine', 'bread']
 
         # maybe we already know what the duplicate values are
         error = DuplicateValue(attr='foods', value='cheese')
@@ -37,3 +46,16 @@ class TestExceptions:
     def test_NoSuchDN(self):
         error = NoSuchDN(dn='cn=foo')
         assert error.msg == 'DN cn=foo does not exist.'
+
+    def test_InvalidDN(self):
+        error = InvalidDN(obj=None, name=None, dn='foo')
+        assert error.msg == 'Invalid DN format: foo'
+        error = InvalidDN(obj='Person', name='liam', dn='foo')
+        assert error.msg == 'Person liam has an invalid dn format: foo'
+
+    def test_LdapperError_msg(self):
+        class CustomError(LdapperError):
+            def __init__(self):
+                self.msg = 'custom message'
+
+        assert str(CustomError()) == '(CustomError) custom message'
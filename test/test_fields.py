@@ -29,6 +29,7 @@ class TestStringField:
         field = StringField('name')
         assert field.coerce_for_python(11) == '11'
         assert field.coerce_for_python('foobar') == 'foobar'
+        assert field.coerce_for_python(b'foobar') == 'foobar'
 
     def test_sanitize_for_ldap(self):
         field = StringField('name')
@@ -83,6 +84,21 @@ class TestIntegerField:
         with pytest.raises(ValueError):
             field.coerce_for_python('foo')
 
+    def test_subclass_coerce_for_python_gets_str(self):
+        class HexField(IntegerField):
+            def coerce_for_python(self, value):
+                return int(value, 16)
+
+        class Foo(MyLDAPNode):
+            uid = StringField('uid', primary=True)
+            number = HexField('number')
+
+        entry = {'uid': [b'liam'], 'number': [b'ff']}
+        assert Foo._parse_ldap_entry('uid=liam,dc=acme,dc=org', entry) \
+            .number == 255
+        assert IntegerField('id')._from_entry_values([b'12']) == b'12'
+        assert HexField('id')._from_entry_values([b'12']) == '12'
+
     def test_sanitize_for_ldap(self):
         field = IntegerField('id')
         assert field.sanitize_for_ldap(11) == b'11'
@@ -1,37 +1,31 @@
 # -*- coding: utf-8 -*-
 
+import os
+
+import ldap
 import pytest
 
 from datetime import datetime
 
-from ldapper.connection import BaseConnection
-from ldapper.ldapnode import LDAPNode
 from ldapper.fields import (
+    GeneralizedTimeField,
     ListField,
     StringField,
     SystemField,
 )
 
+from . import utils
+
 
 class SystemStringField(SystemField, StringField):
     pass
 
 
-class SystemDateField(SystemField, StringField):
-
-    def coerce_for_python(self, value):
-        if value:
-            return datetime.strptime(value, "%Y%m%d%H%M%SZ")
-
-
-class connection(BaseConnection):
-    BASE_DN = 'dc=acme,dc=org'
-    URI = 'ldap://localhost:389'
-
+class SystemDateField(SystemField, GeneralizedTimeField):
+    pass
 
-class MyLDAPNode(LDAPNode):
-    connection = connection
 
+class MyLDAPNode(utils.MyLDAPNode):
     date_created = SystemDateField('createTimestamp', optional=True)
     date_modified = SystemDateField('modifyTimestamp', optional=True)
     user_created = SystemStringField('creatorsName', optional=True)
@@ -54,13 +48,33 @@ class Person(MyLDAPNode):
         human_readable_name = 'LDAP Person'
 
 
-person_kwargs = {'uid': 'liam', 'lastname': 'Monahan', 'fullname': 'Liam Monahan'}
+class ROPerson(Person):
+    uid = StringField('uid', primary=True, readonly=True)
+
+
+PERSON_NON_SYSTEM_FIELDS = frozenset(['addresses', 'fullname', 'lastname', 'uid'])
+PERSON_SYSTEM_FIELDS = frozenset(
+    ['date_created', 'date_modified', 'user_created', 'user_modified'])
 
+# Tests that write to the LDAP use this uid.  Each pytest-xdist worker
+# gets its own, so that parallel runs do not collide.
+WORKER = os.environ.get('PYTEST_XDIST_WORKER')
+UID = 'liam-%s' % WORKER if WORKER else 'liam'
+PERSON_DN = 'uid=%s,ou=people,dc=acme,dc=org' % UID
 
-# TODO this should get moved somewhere more central
-conn = connection.connect(logindn='cn=admin,dc=acme,dc=org',
-                          password='JonSn0w')
-connection.set_connection(conn)
+person_kwargs = {'uid': UID, 'lastname': 'Monahan', 'fullname': 'Liam Monahan'}
+
+
+# bind when the tests run rather than when the module is collected
+@pytest.fixture(scope='module', autouse=True)
+def bound_connection():
+    conn = utils.Connection.connect(logindn='cn=admin,dc=acme,dc=org',
+                                    password='JonSn0w')
+    utils.Connection.set_connection(conn)
+    yield conn
+    conn.close()
+    # a closed connection cannot be used again; later modules set their own
+    del utils.Connection.conn
 
 
 # TODO this should also get moved somewhere else once we get further along
@@ -97,9 +111,30 @@ class TestLDAPNode:
         # lastname should be overidden in the child class
         assert SpecialPerson._fields['lastname'].optional
 
+    def test_objectclass_filter_cached(self):
+        assert Person._objectclass_filter == Person._build_objectclass_filter()
+        assert Person.objectclass_filter() is Person._objectclass_filter
+        assert Person._fetch_filter_format % 'liam' == \
+            '(&(uid=liam)%s)' % Person._objectclass_filter
+
+        class Test(MyLDAPNode):
+            pass
+        assert Test._objectclass_filter is None
+        assert Test._fetch_filter_format is None
+        with pytest.raises(ValueError):
+            Test.objectclass_filter()
+
+    def test_searchable_fields_filters(self):
+        class SearchablePerson(Person):
+            class Meta(Person.Meta):
+                searchable_fields = ['uid', 'cn']
+
+        assert SearchablePerson.searchable_fields_search_prefix_filter('li') == \
+            '(|(uid=li*)(cn=li*))'
+        assert SearchablePerson.searchable_fields_search_string_filter('l*') == (
+            r'(|(uid=l\2a)(cn=l\2a)(uid=*l\2a*)(cn=*l\2a*))')
+
     def test_readonly_field(self, caplog):
-        class ROPerson(Person):
-            uid = StringField('uid', primary=True, readonly=True)
         person = ROPerson(uid='liam', lastname='Alpert', fullname='Ram Dass')
 
         # cannot set
@@ -133,48 +168,53 @@ class TestLDAPNode:
                 another_primary = StringField('anotherPrimary', primary=True)
 
     def test_non_system_fields(self):
-        assert (
-            sorted(['addresses', 'fullname', 'lastname', 'uid']) ==
-            sorted(Person._non_system_fields.keys())
-        )
-        assert (
-            sorted(['date_created', 'date_modified', 'user_created', 'user_modified']) ==
-            sorted(Person._system_fields.keys())
-        )
-
-    def test_system_fields(self):
-        person = Person(**person_kwargs)
-        person.save()
-
-        # test that system fields are not included in the diff
-        assert person.diff() == {}
-
-        # a new object does not have a date_created yet
-        # you must refetch to populate those values
-        assert person.date_created is None
-        person = person.refetch()
-        assert person.date_created is not None
-
-        # changing the system fields should not have any effect since
-        # they will never be saved back to ldap
-        person.date_created = datetime.now()
-        assert person.diff() == {}
+        assert set(Person._non_system_fields) == PERSON_NON_SYSTEM_FIELDS
+        assert set(Person._system_fields) == PERSON_SYSTEM_FIELDS
+        assert tuple(Person._non_system_fields) == \
+            Person._non_system_field_names
+        assert {name for name, _, _ in Person._writable_fields} == \
+            PERSON_NON_SYSTEM_FIELDS
+        assert {name for name, _ in Person._diff_fields} == \
+            PERSON_NON_SYSTEM_FIELDS
+
+    def test_parse_ldap_entry(self):
+        entry = {
+            'uid': [UID.encode()],
+            'sn': [b'Monahan'],
+            'cn': [b'Liam Monahan'],
+        }
+        p = Person._parse_ldap_entry(get_person().dn, entry)
+        assert p == get_person()
+        assert p.addresses == []
 
-        # system fields shall not used to generate the object hash
-        hash_before = hash(person)
-        person.date_modified = 'foo'
-        assert hash_before == hash(person)
+        p = ROPerson._parse_ldap_entry(get_person().dn, entry)
+        assert p.uid == UID
 
-        person.delete()
+    def test_present_attrvals(self):
+        p = Person(addresses=['a@acme.org', 'b@acme.org'], **person_kwargs)
+        assert p.has_attrval('addresses', 'a@acme.org')
+        assert p.present_attrvals(
+            'addresses', ['c@acme.org', 'b@acme.org', 'a@acme.org']) == \
+            ['b@acme.org', 'a@acme.org']
+        assert p.present_attrvals('addresses', []) == []
 
     def test_ldapnode_repr(self):
         p = Person(**person_kwargs)
-        assert repr(p) == 'uid=liam,ou=people,dc=acme,dc=org'
+        assert repr(p) == PERSON_DN
 
     def test_ldapnode_hash(self):
         p = Person(**person_kwargs)
         assert hash(p) == hash(p)
 
+        # list fields are left out of the hash
+        other = Person(addresses=['1 Main St'], **person_kwargs)
+        assert hash(other) == hash(p)
+        assert len({p, Person(**person_kwargs)}) == 1
+
+        # the hash follows changes to the hashable fields
+        other.lastname = 'Jones'
+        assert hash(other) != hash(p)
+
     def test_ldapnode_eq(self):
         p1 = Person(**person_kwargs)
         p2 = Person(**person_kwargs)
@@ -186,6 +226,11 @@ class TestLDAPNode:
         p2.lastname = 'Caesar'
         assert not p1.__eq__(p2)
 
+        # objects that differ in their primary value are not equal
+        p3 = Person(**person_kwargs)
+        p3.uid = 'gina'
+        assert not p1.__eq__(p3)
+
     def test_ldapnode_ordering(self):
         aaa = Person(uid='aaa', lastname='ln', fullname='fn')
         bbb = Person(uid='bbb', lastname='ln', fullname='fn')
@@ -206,87 +251,74 @@ class TestLDAPNode:
         )
         expected = """DN: uid=liam,ou=people,dc=acme,dc=org
        uid: liam
-  lastname: liam
+  lastname: %s
  addresses: liam@acme.org
- addresses: liam"""
+ addresses: %s""" % (UID, UID)
         assert expected == str(p)
 
     def test_ldapnode_dn(self):
         p = Person(**person_kwargs)
 
         # test that dn() works
-        assert p.dn == 'uid=liam,ou=people,dc=acme,dc=org'
+        assert p.dn == PERSON_DN
+
+        # the dn follows changes to the fields it is built from
+        p.uid = 'gina'
+        assert p.dn == 'uid=gina,ou=people,dc=acme,dc=org'
+        p.uid = UID
 
         # setting the dn should raise an error
         with pytest.raises(ValueError):
             p.dn = 'uid=foo'
 
         # test dnattr()
-        assert p.dnattr() == 'liam'
+        assert p.dnattr() == UID
 
         # test dnattrs()
-        assert p.dnattrs() == {'uid': 'liam'}
+        assert p.dnattrs() == {'uid': UID}
 
     def test_ldapnode_create(self):
         person = Person.create(**person_kwargs)
-        assert person.uid == 'liam'
+        assert person.uid == UID
 
-    def test_fetch(self):
-        p = Person(**person_kwargs)
+    def test_fetch_cache_invalidated_by_writes(self, result_cache):
+        p = get_person()
         p.save()
+        assert Person.fetch(p.uid).lastname == 'Monahan'
 
-        assert Person.fetch('liam') == p
-        assert Person.fetch(uid='liam') == p
-        assert Person.fetch(p) == p
-
-        assert Person.fetch('who') is None
-
-        p.delete()
-
-    def test_fetch_by(self):
-        p = Person(**person_kwargs)
+        # the second fetch is served from the connection's cache, which
+        # the save must have dropped
+        p.lastname = 'Jones'
         p.save()
-
-        assert Person.fetch_by(attrs={}) is None
-        assert Person.fetch_by(attrs={'uid': p.uid}) == p
-        assert Person.fetch_by(attrs={'uid': p.uid + 'a'}) is None
-
-        p.delete()
-
-    def test_fetch_by_dn(self):
-        p = Person(**person_kwargs)
-        p.save()
-
-        assert Person.fetch_by_dn('uid=kfjsdlkjf,ou=people,dc=acme,dc=org') is None
-        assert Person.fetch_by_dn('uid,ou=people,dc=acme,dc=org') is None
-        assert Person.fetch_by_dn('malformed') is None
-        assert Person.fetch_by_dn(p.dn) == p
-
-        # for setUp/tearDown efficiency's sake, test obj_exists() here too
+        assert Person.fetch(p.uid).lastname == 'Jones'
         assert Person.obj_exists(p.uid)
-        assert not Person.obj_exists(p.uid + 'a')
-
-        assert Person.dn_exists(p.dn)
 
         p.delete()
+        assert Person.fetch(p.uid) is None
+        assert not Person.obj_exists(p.uid)
 
-    def test_refetch(self):
-        p = Person(**person_kwargs)
+    def test_refetch_bypasses_cache(self, result_cache):
+        p = get_person()
         p.save()
-        p.lastname = p.lastname + 'aaa'
-
-        untainted_person = Person.fetch(p.uid)
-        assert untainted_person != p
-        assert untainted_person == p.refetch()
-
-        # assert that refetch does not modify the existing object
-        assert untainted_person != p
-
-        p.delete()
+        assert Person.fetch(p.uid).lastname == 'Monahan'
+
+        # change the entry behind the cache's back
+        with p.conn._pool.checkout() as ldaps:
+            ldaps.modify_s(p.dn, [(ldap.MOD_REPLACE, 'sn', [b'Jones'])])
+        assert Person.fetch(p.uid).lastname == 'Monahan'
+        assert p.refetch().lastname == 'Jones'
+        assert p.diff() == {'lastname': ('Jones', 'Monahan')}
+
+        # and delete it, which exists() must notice
+        assert p.conn.exists(p.dn)
+        with p.conn._pool.checkout() as ldaps:
+            ldaps.delete_s(p.dn)
+        assert p.conn.exists(p.dn)
+        assert not p.exists()
 
     def test_diff(self):
         person = Person(
-            uid='liam',
+            uid=UID,
             lastname='Monahan',
             fullname='Liam Monahan',
         )
@@ -295,7 +327,7 @@ class TestLDAPNode:
             'addresses': (None, []),
             'fullname': (None, 'Liam Monahan'),
             'lastname': (None, 'Monahan'),
-            'uid': (None, 'liam')
+            'uid': (None, UID)
         }
 
         person.save()
@@ -308,9 +340,73 @@ class TestLDAPNode:
 
         person.delete()
 
+    def test_diff_uses_snapshot(self, monkeypatch):
+        person = get_person()
+        person.save()
+
+        fetched = Person.fetch(person.uid)
+        assert fetched._ldap_snapshot is not None
+
+        def fail():
+            raise AssertionError('refetch() should not be needed')
+        monkeypatch.setattr(fetched, 'refetch', fail)
+        fetched.lastname = 'Jones'
+        assert fetched.diff(snapshot=fetched._ldap_snapshot) == \
+            {'lastname': (person.lastname, 'Jones')}
+        fetched.save()
+        assert fetched._ldap_snapshot is None
+
+        monkeypatch.undo()
+        assert fetched.diff() == {}
+
+        fetched.delete()
+
+    def test_save_after_entry_changed_behind_snapshot(self):
+        person = get_person()
+        person.save()
+
+        # someone else sets an attribute that this object then sets too
+        fetched = Person.fetch(person.uid)
+        person.conn.add_attr(person.dn, 'mailLocalAddress', [b'a@acme.org'])
+        fetched.addresses = ['b@acme.org']
+        fetched.save()
+        assert Person.fetch(person.uid).addresses == ['b@acme.org']
+
+        # someone else removes an attribute that this object then clears
+        fetched = Person.fetch(person.uid)
+        person.conn.delete_attr(person.dn, 'mailLocalAddress')
+        fetched.addresses = []
+        fetched.save()
+        assert Person.fetch(person.uid).addresses == []
+
+        person.delete()
+
+    def test_save_sends_one_modify(self, monkeypatch):
+        person = get_person()
+        person.save()
+
+        calls = []
+        modify = person.conn.modify
+
+        def counting_modify(dn, mods):
+            calls.append(mods)
+            return modify(dn, mods)
+        monkeypatch.setattr(person.conn, 'modify', counting_modify)
+
+        person.lastname = 'Jones'
+        person.fullname = 'Liam Jones'
+        person.addresses = ['liam@acme.org']
+        person.save()
+        assert len(calls) == 1
+        assert len(calls[0]) == 3
+        assert person.diff() == {}
+
+        monkeypatch.undo()
+        person.delete()
+
     def test_happy_path_crud(self):
         person = Person(
-            uid='liam',
+            uid=UID,
             lastname='Monahan',
             fullname='Liam Monahan',
         )
@@ -319,3 +415,105 @@ class TestLDAPNode:
 
         person.delete()
         assert not person.exists()
+
+    def test_bulk_save(self):
+        existing = get_person()
+        existing.save()
+        existing.lastname = 'Jones'
+
+        people = [existing]
+        for uid in ('ivy', 'jack'):
+            p = get_person()
+            p.uid = uid
+            people.append(p)
+        invalid = Person(uid='kim')
+        people.append(invalid)
+
+        assert Person.bulk_save(people) == [True, True, True, False]
+        assert existing.refetch().lastname == 'Jones'
+        assert all(p.exists() for p in people[1:3])
+        assert not invalid.exists()
+
+        for p in people[:3]:
+            p.delete()
+
+
+@pytest.mark.usefixtures('saved_person')
+class TestLDAPNodeReads:
+    """Tests that only read the one Person saved for the whole class."""
+
+    @pytest.fixture(scope='class')
+    def saved_person(self):
+        person = get_person()
+        person.save()
+        yield person
+        person.delete()
+
+    def test_system_fields(self):
+        person = Person(**person_kwargs)
+
+        # test that system fields are not included in the diff
+        assert person.diff() == {}
+
+        # a new object does not have a date_created yet
+        # you must refetch to populate those values
+        assert person.date_created is None
+        person = person.refetch()
+        assert person.date_created is not None
+
+        # changing the system fields should not have any effect since
+        # they will never be saved back to ldap
+        person.date_created = datetime.now()
+        assert person.diff() == {}
+
+        # system fields shall not used to generate the object hash
+        hash_before = hash(person)
+        person.date_modified = 'foo'
+        assert hash_before == hash(person)
+
+    def test_fetch(self):
+        p = Person(**person_kwargs)
+
+        assert Person.fetch(UID) == p
+        assert Person.fetch(uid=UID) == p
+        assert Person.fetch(p) == p
+
+        assert Person.fetch('who') is None
+
+    def test_fetch_by(self):
+        p = Person(**person_kwargs)
+
+        assert Person.fetch_by(attrs={}) is None
+        assert Person.fetch_by(attrs={'uid': p.uid}) == p
+        assert Person.fetch_by(attrs={'uid': p.uid + 'a'}) is None
+        # filter values are matched literally
+        assert Person.fetch_by(attrs={'uid': '*'}) is None
+        assert Person.fetch('*') is None
+
+    def test_fetch_by_dn(self):
+        p = Person(**person_kwargs)
+
+        assert Person.fetch_by_dn('uid=kfjsdlkjf,ou=people,dc=acme,dc=org') is None
+        assert Person.fetch_by_dn('uid,ou=people,dc=acme,dc=org') is None
+        assert Person.fetch_by_dn('malformed') is None
+        # the RDN value is matched literally, not as a filter
+        assert Person.fetch_by_dn('uid=*,ou=people,dc=acme,dc=org') is None
+        assert Person.fetch_by_dn('uid=foo(bar),ou=people,dc=acme,dc=org') is None
+        assert Person.fetch_by_dn(p.dn) == p
+
+        # for setUp/tearDown efficiency's sake, test obj_exists() here too
+        assert Person.obj_exists(p.uid)
+        assert not Person.obj_exists(p.uid + 'a')
+
+        assert Person.dn_exists(p.dn)
+
+    def test_refetch(self):
+        p = Person(**person_kwargs)
+        p.lastname = p.lastname + 'aaa'
+
+        untainted_person = Person.fetch(p.uid)
+        assert untainted_person != p
+        assert untainted_person == p.refetch()
+
+        # assert that refetch does not modify the existing object
+        assert untainted_person != p
@@ -1,7 +1,5 @@
 # -*- coding: utf-8 -*-
 
-from __future__ import absolute_import
-
 import logging
 
 from ldapper.logging import ProxyLogger
@@ -30,6 +28,7 @@ class TestProxyLogger:
         # but now it should be empty
         assert logger.flush() == []
         assert logger.get_messages() == []
+        assert not logger.has_warnings()
 
     def test_logging_info(self):
         logger = ProxyLogger(logger=logging.getLogger('test'))
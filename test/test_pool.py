@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+import threading
+
+import ldap
+import pytest
+
+from ldapper.pool import ConnectionPool
+
+URI = 'ldap://localhost:389'
+LOGINDN = 'cn=admin,dc=acme,dc=org'
+PASSWORD = 'JonSn0w'
+
+
+class TestConnectionPool:
+
+    def test_pool_fill(self):
+        pool = ConnectionPool(URI, LOGINDN, PASSWORD, max_size=2)
+        pool.fill(5)
+        # never more than max_size handles
+        assert pool._size == 2
+
+        with pool.checkout() as handle:
+            assert handle.whoami_s() == 'dn:' + LOGINDN
+        pool.clear()
+        assert pool._size == 0
+
+    def test_pool_fill_bad_credentials(self):
+        pool = ConnectionPool(URI, LOGINDN, 'wrong')
+        with pytest.raises(ldap.INVALID_CREDENTIALS):
+            pool.fill(1)
+        assert pool._size == 0
+
+    def test_pool_anonymous(self):
+        pool = ConnectionPool(URI)
+        with pool.checkout() as handle:
+            assert not handle.whoami_s()
+
+    def test_pool_checkout_reuses_handles(self):
+        pool = ConnectionPool(URI, LOGINDN, PASSWORD)
+        with pool.checkout() as first:
+            pass
+        with pool.checkout() as second:
+            assert first is second
+        assert pool._size == 1
+
+    def test_pool_bind_and_revert(self):
+        pool = ConnectionPool(URI)
+        assert pool.bind_and_revert(LOGINDN, PASSWORD)
+        assert not pool.bind_and_revert(LOGINDN, 'wrong')
+        assert not pool.bind_and_revert(LOGINDN, '')
+        # the handle is back to its anonymous identity
+        with pool.checkout() as handle:
+            assert not handle.whoami_s()
+
+    def test_pool_waiter_survives_discarded_handle(self):
+        pool = ConnectionPool(URI, max_size=1)
+        results = []
+
+        def wait_for_handle():
+            with pool.checkout() as handle:
+                results.append(handle.whoami_s())
+
+        with pytest.raises(ldap.SERVER_DOWN):
+            with pool.checkout():
+                waiter = threading.Thread(target=wait_for_handle)
+                waiter.start()
+                # the only handle dies while the waiter is blocked on it
+                raise ldap.SERVER_DOWN({'desc': "Can't contact LDAP server"})
+        waiter.join(timeout=5)
+        assert not waiter.is_alive()
+        assert results == ['']
+        assert pool._size == 1
+
+    def test_pool_close_wakes_waiters(self):
+        pool = ConnectionPool(URI, max_size=1)
+        errors = []
+
+        def wait_for_handle():
+            try:
+                pool._acquire()
+            except ValueError as e:
+                errors.append(e)
+
+        with pool.checkout():
+            waiter = threading.Thread(target=wait_for_handle)
+            waiter.start()
+            pool.close()
+        waiter.join(timeout=5)
+        assert not waiter.is_alive()
+        assert len(errors) == 1
+        assert pool._size == 0
+
+    def test_pool_bind_and_revert_failure(self, monkeypatch):
+        pool = ConnectionPool(URI)
+        pool.fill(1)
+
+        def refuse(handle):
+            raise ldap.UNWILLING_TO_PERFORM({'desc': 'refused'})
+        monkeypatch.setattr(pool, '_bind', refuse)
+        with pytest.raises(ldap.UNWILLING_TO_PERFORM):
+            pool.bind_and_revert(LOGINDN, PASSWORD)
+        # the handle still bound as LOGINDN was thrown away, not pooled
+        assert pool._size == 0
+        assert pool._idle.empty()
+
+    def test_pool_replaces_dead_idle_handles(self):
+        pool = ConnectionPool(URI, LOGINDN, PASSWORD, idle_timeout=0)
+        with pool.checkout() as first:
+            pass
+        # simulate the server having dropped the idle connection
+        first.unbind_s()
+        with pool.checkout() as second:
+            assert second is not first
+            assert second.whoami_s() == 'dn:' + LOGINDN
+        assert pool._size == 1
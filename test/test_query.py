@@ -19,6 +19,26 @@ class TestQ:
     def test_one_condition(self):
         assert Q(firstname='Liam').compile(Person) == '(givenName=Liam)'
 
+    def test_compile_is_cached(self):
+        q = Q(firstname='Liam')
+        assert q.compile(Person) is q.compile(Person)
+
+        # combining with another query afterwards still shows up
+        qset = q | Q(lastname='Monahan')
+        assert qset.compile(Person) == '(|(givenName=Liam)(sn=Monahan))'
+        qset = qset | Q(uid='liam')
+        assert qset.compile(Person) == \
+            '(|(givenName=Liam)(sn=Monahan)(uid=liam))'
+
+        # so does a change to a combination nested in another one
+        inner = Q(firstname='Liam') | Q(firstname='Bob')
+        outer = inner & Q(lastname='Monahan')
+        assert outer.compile(Person) == \
+            '(&(|(givenName=Liam)(givenName=Bob))(sn=Monahan))'
+        inner | Q(firstname='Ringo')
+        assert outer.compile(Person) == \
+            '(&(|(givenName=Liam)(givenName=Bob)(givenName=Ringo))(sn=Monahan))'
+
     def test_or_conditions(self):
         qset = Q(firstname='Liam') | Q(lastname='Monahan')
         assert qset.compile(Person) == '(|(givenName=Liam)(sn=Monahan))'
@@ -116,6 +136,10 @@ class TestQ:
         qset = Q(firstname='Liam', lastname='Monahan') | Q(uid='liam')
         assert qset.compile(Person) == '(|(&(givenName=Liam)(sn=Monahan))(uid=liam))'
 
+        # the order the conditions are given in does not matter
+        assert Q(uid='liam', firstname='Liam').compile(Person) == \
+            Q(firstname='Liam', uid='liam').compile(Person)
+
     def test_attribute_misspelling(self):
         with pytest.raises(AttributeError):
             Q(missingattr='foo').compile(Person)
@@ -2,12 +2,19 @@
 
 import pytest
 
+from datetime import datetime
+
 from .test_ldapnode import get_person
 
 from ldapper.exceptions import InvalidDN
 from ldapper.utils import (
     bolded,
+    chunks_of,
+    compile_format,
+    parse_format,
     dn_attribute,
+    escape_filter_value,
+    generalized_time_parse,
     strip_dn_path,
     middle_dn,
     get_attr,
@@ -28,10 +35,52 @@ class TestUtils(object):
     def test_bolded(self):
         assert bolded('foobar') == '\033[1mfoobar\033[0m'
 
+    def test_chunks_of(self):
+        assert list(chunks_of([1, 2, 3, 4, 5], 2)) == [[1, 2], [3, 4], [5]]
+        assert list(chunks_of([1, 2], 2)) == [[1, 2]]
+        assert list(chunks_of([], 2)) == []
+
+    @pytest.mark.parametrize("fmt,mapping", [
+        ('ou=people', {}),
+        ('uid=%(uid)s,ou=people', {'uid': 'liam'}),
+        ('cn=%(cn)s,host=%(host)s,ou={hosts}', {'cn': 'foo', 'host': 3}),
+        ('uidNumber=%(uid)d', {'uid': 3}),
+        ('cn=100%%', {}),
+    ])
+    def test_compile_format(self, fmt, mapping):
+        assert compile_format(fmt)(mapping) == fmt % mapping
+
+    def test_compile_format_missing_key(self):
+        assert compile_format(None) is None
+        with pytest.raises(KeyError):
+            compile_format('uid=%(uid)s,ou=people')({})
+
+    def test_parse_format(self):
+        assert parse_format('uid=%(uid)s,ou=%(ou)s') == \
+            ('uid={},ou={}', ('uid', 'ou'))
+        assert parse_format('cn={%(cn)s}') == ('cn={{{}}}', ('cn',))
+        assert parse_format('uidNumber=%(uid)d') is None
+
+    def test_escape_filter_value(self):
+        assert escape_filter_value('liam') == 'liam'
+        assert escape_filter_value('*)(uid=*') == r'\2a\29\28uid=\2a'
+        assert escape_filter_value('a\\b\x00') == r'a\5cb\00'
+        assert escape_filter_value(42) == '42'
+
+    def test_generalized_time_parse(self):
+        assert generalized_time_parse('20240229235901Z') == \
+            datetime(2024, 2, 29, 23, 59, 1)
+        with pytest.raises(ValueError):
+            generalized_time_parse('20240230000000Z')
+        with pytest.raises(ValueError):
+            generalized_time_parse('2024-02-29')
+
     def test_dn_attribute(self):
         assert dn_attribute('cn=foo,dc=bar', 'cn') == 'foo'
         assert dn_attribute('cn=foo,cn=bar,dc=ba', 'cn') == 'foo'
         assert dn_attribute('cn=foo,dc=bar', 'uid') is None
+        assert dn_attribute('cn=foo,dc=bar', 'dc') == 'bar'
+        assert dn_attribute('uid=foo,dc=bar', 'id') is None
 
     def test_strip_dn_path(self):
         dn = 'cn=foo,ou=groups,dc=example'
@@ -40,6 +89,9 @@ class TestUtils(object):
         assert strip_dn_path(dn, left=left) == 'ou=groups,dc=example'
         assert strip_dn_path(dn, right=right) == 'cn=foo,ou=groups'
         assert strip_dn_path(dn, left=left, right=right) == 'ou=groups'
+        # matching is case insensitive, with or without regex characters
+        assert strip_dn_path(dn, right=',DC=Example') == 'cn=foo,ou=groups'
+        assert strip_dn_path('cn=a,dc=ex.org', right=',DC=ex.org') == 'cn=a'
 
     def test_middle_dn(self):
         dn = 'cn=foo,ou=middle-mgrs,ou=groups,dc=example'